@@ -1,21 +1,55 @@
 import streamlit as st
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import load_model
-import numpy as np
+import logging
 import os
-import cv2
-class_names = [
-    'INDIAN BEAN BUG',
-    'COMMON CROW BUTTERFLY',
-    'INDIAN RED BUG',
-    'ORIENTAL BEETLE',
-    'PLAIN TIGER BUTTERFLY',
-    'INDIAN POTTER WASP',
-    'SLENDER MEADOW KATYDID',
-    'SUNDOWNER MOTH',
-    'TROPICAL TIGER MOTH',
-    'WANDERING GLIDER']
+import tempfile
+import time
+
+from insect_id import (
+    CASCADE_MODEL_PATH,
+    CONFIDENCE_THRESHOLD,
+    EMBEDDING_INDEX_PATH,
+    INFERENCE_WORKERS,
+    METRICS,
+    METRICS_FILE,
+    METRICS_PORT,
+    MODEL_BACKEND,
+    MODEL_PATH,
+    TFLITE_MODEL_PATH,
+    BackgroundLoader,
+    EmbeddingIndex,
+    FeatureExtractor,
+    InferenceCache,
+    InferenceWorkerPool,
+    MicroBatchScheduler,
+    ModelCascade,
+    PredictionStore,
+    NOT_APPLICABLE,
+    PREDICTION_STORE_PATH,
+    QUESTIONS,
+    UNANSWERED,
+    QuestionSelector,
+    TaxonomyRollup,
+    UNCERTAIN_SPECIES,
+    backend_for_path,
+    dhash,
+    build_timeline,
+    identify,
+    iter_batch_inference,
+    iter_video_predictions,
+    load_model,
+    make_predictor,
+    make_result,
+    model_fingerprint,
+    preprocess,
+    rank,
+    taxonomy,
+    thumbnail,
+)
+
+logger = logging.getLogger(__name__)
+
+run_started = time.perf_counter()
+
 # --- SESSION STATE INITIALIZATION ---
 
 if "qa_answers" not in st.session_state:
@@ -29,474 +63,707 @@ if "initial_confidence" not in st.session_state:
 
 if "initial_pred_class" not in st.session_state:
     st.session_state.initial_pred_class = ""
-    
-# --- Global Variables ---
-CONFIDENCE_THRESHOLD = 0.95
-IMG_HEIGHT = 224
-IMG_WIDTH = 224
 
-# --- Paths ---
-model_path = "INSECT_CNN_FINAL.keras"
+if "initial_predictions" not in st.session_state:
+    st.session_state.initial_predictions = None
+
+if "clarify_id" not in st.session_state:
+    st.session_state.clarify_id = ""
+
+if "upload_key" not in st.session_state:
+    st.session_state.upload_key = None
+
+if "qa_submitted_id" not in st.session_state:
+    st.session_state.qa_submitted_id = None
 
+if "identified_key" not in st.session_state:
+    st.session_state.identified_key = None
+    
 # --- Load Model ---
+# TensorFlow is imported, the model deserialized and warmed up on a background
+# thread, so the title and uploader render straight away on a cold replica
+def load_keras_model(timer, backend=MODEL_BACKEND):
+    if INFERENCE_WORKERS:
+        # Each worker process imports TensorFlow, loads and warms up its own model copy
+        with timer.phase("worker_pool_start"):
+            model = predictor = InferenceWorkerPool(backend=backend)
+            model.wait_ready()
+    else:
+        with timer.phase("tensorflow_import"):
+            import tensorflow  # noqa: F401
+        with timer.phase("model_deserialize"):
+            model = load_model(backend=backend)
+        with timer.phase("warm_up"):
+            # Trace the compiled path now so the first user doesn't pay for it
+            predictor = make_predictor(model)
+            predictor.warm_up()
+    feature_extractor = None
+    # Similar specimens need the Keras model's layers in this process; see the sidebar note
+    if not INFERENCE_WORKERS and os.path.isdir(EMBEDDING_INDEX_PATH):
+        with timer.phase("feature_extractor_warm_up"):
+            try:
+                feature_extractor = FeatureExtractor(model)
+                feature_extractor.warm_up()
+            except TypeError as e:
+                logger.info("Similar specimens unavailable: %s", e)
+    fast_predictor = None
+    if CASCADE_MODEL_PATH:
+        with timer.phase("cascade_model_load"):
+            fast_predictor = make_predictor(load_model(CASCADE_MODEL_PATH, backend=backend_for_path(CASCADE_MODEL_PATH)))
+            fast_predictor.warm_up()
+    for phase, seconds in timer.phases.items():
+        METRICS.set_gauge("startup_phase_seconds", seconds, phase=phase)
+    return model, predictor, fast_predictor, feature_extractor
+
+# The cascade's fast model would run in this process, importing TensorFlow into
+# the server that the worker processes exist to keep it out of
+if INFERENCE_WORKERS and CASCADE_MODEL_PATH:
+    st.error("INSECT_CASCADE_MODEL can't be combined with INSECT_INFERENCE_WORKERS: "
+             "unset one of them and restart the app.")
+    st.stop()
+
 @st.cache_resource
-def load_keras_model():
+def start_model_loader():
+    return BackgroundLoader(load_keras_model)
+
+model_loader = start_model_loader()
+
+# --- Metrics Export ---
+# Prometheus text over HTTP (INSECT_METRICS_PORT) and/or a file (INSECT_METRICS_FILE)
+@st.cache_resource
+def start_metrics_exporters():
+    from insect_id.metrics import start_file_exporter, start_http_server
+
+    if METRICS_PORT is not None:
+        start_http_server(METRICS_PORT)
+    if METRICS_FILE:
+        start_file_exporter(METRICS_FILE)
+    return True
+
+start_metrics_exporters()
+
+# --- Taxonomy Roll-up ---
+# Compiled once per process; fails at startup if a model class has no taxonomy entry
+@st.cache_resource
+def get_taxonomy_rollup():
+    return TaxonomyRollup()
+
+taxonomy_rollup = get_taxonomy_rollup()
+
+def record_outcome(result):
+    """Count a fresh classification as low or high confidence against CONFIDENCE_THRESHOLD."""
+    confidence = "low" if result["initial_confidence"] < CONFIDENCE_THRESHOLD else "high"
+    METRICS.inc("identifications_total", confidence=confidence)
+
+def get_model():
+    """Block until the background load finishes, then return (model, predictor, fast_predictor, feature_extractor)."""
     try:
-        model = load_model(model_path)
-        return model
+        with st.spinner("Loading model..."):
+            return model_loader.result()
     except Exception as e:
         st.error(f"Error loading model: {e}")
         st.stop()
 
-model = load_keras_model()
-
-# --- Taxonomy Dictionary ---
-taxonomy = {
-    'BEAN BUG': {
-        'common_name': 'Bean Bug',
-        'species': 'Riptortus pedestris',
-        'genus': 'Riptortus',
-        'family': 'Alydidae',
-        'order': 'Hemiptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'COMMON CROW BUTTERFLY': {
-        'common_name': 'Common Crow Butterfly',
-        'species': 'Euploea core',
-        'genus': 'Euploea',
-        'family': 'Nymphalidae',
-        'order': 'Lepidoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'INDIAN RED BUG': {
-        'common_name': 'Indian Red Bug',
-        'species': 'Dysdercus cingulatus',
-        'genus': 'Dysdercus',
-        'family': 'Pyrrhocoridae',
-        'order': 'Hemiptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'ORIENTAL BEETLE': {
-        'common_name': 'Oriental Beetle',
-        'species': 'Anomala orientalis',
-        'genus': 'Anomala',
-        'family': 'Scarabaeidae',
-        'order': 'Coleoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'PLAIN TIGER BUTTERFLY': {
-        'common_name': 'Plain Tiger Butterfly',
-        'species': 'Danaus chrysippus',
-        'genus': 'Danaus',
-        'family': 'Nymphalidae',
-        'order': 'Lepidoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'INDIAN POTTER WASP': {
-        'common_name': 'Potter Wasp',
-        'species': 'Delta pyriforme',
-        'genus': 'Delta',
-        'family': 'Vespidae',
-        'order': 'Hymenoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'SLENDER MEADOW KATYDID': {
-        'common_name': 'Slender Meadow Katydid',
-        'species': 'Conocephalus fasciatus',
-        'genus': 'Conocephalus',
-        'family': 'Tettigoniidae',
-        'order': 'Orthoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'SUNDOWNER MOTH': {
-        'common_name': 'Sundowner Moth',
-        'species': 'Spingomorpha chlorea',
-        'genus': 'Spingomorpha',
-        'family': 'Erebidae',
-        'order': 'Lepidoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'TROPICAL TIGER MOTH': {
-        'common_name': 'Tropical Tiger Moth',
-        'species': 'Asota caricae',
-        'genus': 'Asota',
-        'family': 'Erebidae',
-        'order': 'Lepidoptera',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    },
-    'WANDERING GLIDER': {
-        'common_name': 'Wandering Glider',
-        'species': 'Pantala flavescens',
-        'genus': 'Pantala',
-        'family': 'Libellulidae',
-        'order': 'Odonata',
-        'class': 'Insecta',
-        'phylum': 'Arthropoda',
-        'kingdom': 'Animalia'
-    }
-}
+def predict_batch(batch):
+    return model_loader.result()[1](batch)
 
-# --- Streamlit-compatible ask_questions function ---
-def ask_questions_streamlit():
+# --- Inference Scheduler ---
+# One scheduler per process, so single-image requests from concurrent sessions
+# share forward passes on the shared model instead of contending for it; every
+# coalesced batch runs through the compiled predictor, and with worker
+# processes, one batch can be in flight per worker
+@st.cache_resource
+def get_scheduler():
+    return MicroBatchScheduler(predict_batch, concurrency=max(INFERENCE_WORKERS, 1))
 
-    if not st.session_state.show_questions:
+scheduler = get_scheduler()
+
+# --- Model Cascade ---
+# With INSECT_CASCADE_MODEL set, the small model answers confident images and
+# only the rest go through the scheduler to the full model
+@st.cache_resource
+def get_cascade():
+    if not CASCADE_MODEL_PATH:
         return None
+    return ModelCascade(lambda batch: model_loader.result()[2](batch), scheduler.predict_many)
 
-    st.subheader("Please answer the following questions to help identify the insect:")
+cascade = get_cascade()
+
+# --- Inference Cache ---
+# Shared across sessions and reruns, like the model itself
+@st.cache_resource
+def get_inference_cache():
+    return InferenceCache()
+
+inference_cache = get_inference_cache()
 
-    # Ensure dict exists
-    if "qa_answers" not in st.session_state:
+# --- Prediction Store ---
+# SQLite on disk, so results, answers and final species survive restarts;
+# resized or recompressed re-uploads are matched by perceptual hash
+@st.cache_resource
+def get_prediction_store():
+    if not PREDICTION_STORE_PATH:
+        return None
+    model_path = TFLITE_MODEL_PATH if MODEL_BACKEND == "tflite" else MODEL_PATH
+    return PredictionStore(PREDICTION_STORE_PATH, model=model_fingerprint(model_path, CASCADE_MODEL_PATH))
+
+prediction_store = get_prediction_store()
+
+def stored_result(img_array, entry, key):
+    """Rebuild an inference result from a prediction store entry, without running the model.
+
+    Only a byte-identical upload inherits the entry's answers and final
+    species; a near-duplicate reuses the prediction and is clarified afresh.
+    """
+    exact_match = entry["key"] == key
+    result = make_result(img_array, entry["predictions"])
+    result.update(key=key, stage="store", exact_match=exact_match,
+                  final_species=entry["final_species"] if exact_match else None,
+                  answers=entry["answers"] if exact_match else None)
+    return result
+
+def record_identification(key, answers, final_species):
+    """Attach a clarified species to an upload, so later uploads of it in any session reuse it."""
+    # This session keeps its questionnaire; only others see "Previous Identification"
+    st.session_state.identified_key = key
+    cached = inference_cache.get(key)
+    if cached is not None and cached.get("final_species") == final_species and cached.get("answers") == answers:
+        return
+    if prediction_store is not None:
+        prediction_store.record_identification(key, answers, final_species)
+    # The cache is checked before the store, so its entry must carry the species too
+    if cached is not None:
+        inference_cache.put(key, {**cached, "final_species": final_species, "answers": answers})
+
+def run_inference(file_bytes):
+    """Decode, preprocess and classify an upload, reusing a cached or stored result when possible.
+
+    ``file_bytes`` may be a memoryview over the upload; it is hashed and decoded without copying.
+    """
+    with METRICS.timer("upload_hash"):
+        key = InferenceCache.key_for(file_bytes)
+    result = inference_cache.get(key)
+    if result is not None:
+        METRICS.inc("inference_cache_total", result="hit")
+        logger.info("Inference cache hit: %s", inference_cache.stats())
+        return result
+    METRICS.inc("inference_cache_total", result="miss")
+
+    if prediction_store is not None:
+        entry = prediction_store.get(key)
+        if entry is not None:
+            METRICS.inc("prediction_store_total", result="exact")
+            result = stored_result(None, entry, key)
+            inference_cache.put(key, result)
+            return result
+
+    with METRICS.timer("decode"):
+        img_array = preprocess(file_bytes)[None]
+
+    image_hash = image_thumbnail = None
+    if prediction_store is not None:
+        image_hash, image_thumbnail = dhash(img_array), thumbnail(img_array)
+        entry = prediction_store.nearest(image_hash, image_thumbnail)
+        if entry is not None:
+            # A near-duplicate: reuse its prediction without touching the model
+            METRICS.inc("prediction_store_total", result="near")
+            prediction_store.put(key, image_hash, entry["predictions"], thumbnail=image_thumbnail)
+            result = stored_result(img_array, entry, key)
+            inference_cache.put(key, result)
+            return result
+        METRICS.inc("prediction_store_total", result="miss")
+
+    get_model()
+    with METRICS.timer("predict"):
+        if cascade is None:
+            predictions, stage = scheduler.predict(img_array), "full"
+        else:
+            probabilities, stages = cascade.classify(img_array)
+            predictions, stage = probabilities[0], stages[0]
+
+    result = make_result(img_array, predictions)
+    result.update(key=key, stage=stage)
+    record_outcome(result)
+    inference_cache.put(key, result)
+    if prediction_store is not None:
+        prediction_store.put(key, image_hash, predictions, thumbnail=image_thumbnail)
+    logger.info("Inference cache miss: %s", inference_cache.stats())
+    logger.info("Inference scheduler: %s", scheduler.stats())
+    return result
+
+def iter_upload_inference(uploaded_files):
+    """Yield (index, result) lists for uploads, serving cached ones first and batching the rest.
+
+    Results are identified by position in ``uploaded_files``, not file name:
+    two uploads can share a name (IMG_0001.jpg from two folders).
+    """
+    pending = []
+    for index, f in enumerate(uploaded_files):
+        file_bytes = f.getbuffer()
+        with METRICS.timer("upload_hash"):
+            key = InferenceCache.key_for(file_bytes)
+        result = inference_cache.get(key)
+        if result is None and prediction_store is not None:
+            entry = prediction_store.get(key)
+            if entry is not None:
+                METRICS.inc("prediction_store_total", result="exact")
+                result = stored_result(None, entry, key)
+                inference_cache.put(key, result)
+        if result is not None:
+            yield [(index, result)]
+        else:
+            pending.append(((index, key), file_bytes))
+
+    if not pending:
+        return
+    _, predictor, _, _ = get_model()
+    batches = iter_batch_inference(predictor if cascade is None else cascade, pending)
+    while True:
+        # Decode overlaps prediction here, so the batch is timed as one stage
+        start = time.perf_counter()
+        batch_results = next(batches, None)
+        if batch_results is None:
+            return
+        METRICS.observe("batch_inference", time.perf_counter() - start)
+        yield [(index, store_batch_result(key, result)) for (index, key), result in batch_results]
+
+def store_batch_result(key, result):
+    """Cache and store a fresh batch prediction, or swap in a stored near-duplicate's result.
+
+    Decoding overlaps prediction in the batch pipeline, so the model has
+    already run by the time the image can be hashed; a near match still
+    supplies the stored prediction, as in ``run_inference``.
+    """
+    if "error" in result:
+        return result
+    image_hash = image_thumbnail = entry = None
+    if prediction_store is not None:
+        image_hash, image_thumbnail = dhash(result["img_array"]), thumbnail(result["img_array"])
+        entry = prediction_store.nearest(image_hash, image_thumbnail)
+    if entry is not None:
+        METRICS.inc("prediction_store_total", result="near")
+        prediction_store.put(key, image_hash, entry["predictions"], thumbnail=image_thumbnail)
+        result = stored_result(result["img_array"], entry, key)
+    else:
+        result["key"] = key
+        record_outcome(result)
+        if prediction_store is not None:
+            METRICS.inc("prediction_store_total", result="miss")
+            prediction_store.put(key, image_hash, result["predictions"], thumbnail=image_thumbnail)
+    inference_cache.put(key, result)
+    return result
+
+def show_batch_results(uploaded_files):
+    """Stream batch predictions into a table and offer clarification for low-confidence rows."""
+    st.write(f"Classifying {len(uploaded_files)} images...")
+    progress = st.progress(0.0)
+    table = st.empty()
+
+    rows = []
+    results = {}
+    done = 0
+    for batch_results in iter_upload_inference(uploaded_files):
+        for index, result in batch_results:
+            name = uploaded_files[index].name
+            if "error" in result:
+                st.error(f"Could not read {name}: {result['error']}")
+                continue
+            results[index] = result
+            rows.append({
+                "#": index + 1,
+                "Image": name,
+                "Predicted": result["initial_pred_class"],
+                "Confidence": f"{result['initial_confidence']*100:.2f}%",
+                # Uploads identified earlier carry their clarified species
+                "Identified as": result.get("final_species") or "",
+                "Needs clarification": (result["initial_confidence"] < CONFIDENCE_THRESHOLD
+                                        and not result.get("final_species")),
+            })
+        done += len(batch_results)
+        table.dataframe(rows)
+        progress.progress(done / len(uploaded_files))
+
+    flagged = sorted(row["#"] - 1 for row in rows if row["Needs clarification"])
+    if not flagged:
+        st.success("All images classified with high confidence.")
+        return
+
+    st.warning(f"{len(flagged)} image(s) below {CONFIDENCE_THRESHOLD*100:.0f}% confidence — human clarification required")
+    selected = st.selectbox("Image to clarify", flagged, key="clarify_image",
+                            format_func=lambda index: f"{index + 1}. {uploaded_files[index].name}")
+    if st.button("Clarify selected image"):
+        st.session_state.initial_pred_class = results[selected]["initial_pred_class"]
+        st.session_state.initial_confidence = results[selected]["initial_confidence"]
+        st.session_state.initial_predictions = results[selected]["predictions"]
+        st.session_state.clarify_id = uploaded_files[selected].file_id
+        st.session_state.upload_key = results[selected]["key"]
         st.session_state.qa_answers = {}
+        st.session_state.qa_submitted_id = None
+        st.session_state.show_questions = True
 
-    # Use a form to group questions and submit at once
+# --- Similar Reference Specimens ---
+# Built offline with `python -m insect_id build-index`; memory-mapped, so shared
+# across sessions without being read into memory up front
+@st.cache_resource
+def get_embedding_index():
+    if not os.path.isdir(EMBEDDING_INDEX_PATH):
+        return None
+    return EmbeddingIndex.load(EMBEDDING_INDEX_PATH, mmap=True)
+
+def find_similar_specimens(result, file_bytes):
+    """Reference specimens closest to an upload in the model's feature space, computed once per upload."""
+    index = get_embedding_index()
+    if index is None:
+        return []
+    if "similar" not in result:
+        extractor = get_model()[3]
+        if extractor is None:
+            return []
+        # Stored results carry no image; decode again only for the embedding
+        img_array = result["img_array"] if result["img_array"] is not None else preprocess(file_bytes)[None]
+        with METRICS.timer("similarity_search"):
+            result["similar"] = index.search(extractor(img_array))[0]
+    return result["similar"]
+
+VIDEO_TYPES = ["mp4", "avi", "mov", "mkv"]
+
+def classify_video_upload(video_file):
+    """Sample and classify an uploaded clip; cv2.VideoCapture needs a path, so it goes via a temp file."""
+    _, predictor, _, _ = get_model()
+    status = st.empty()
+    records = []
+    suffix = os.path.splitext(video_file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        tmp.write(video_file.getbuffer())
+        tmp.flush()
+        with METRICS.timer("video"):
+            for record in iter_video_predictions(predictor if cascade is None else cascade, tmp.name):
+                records.append(record)
+                classified = sum(r["classified"] for r in records)
+                status.write(f"Sampled {len(records)} frames, classified {classified}...")
+    status.empty()
+    return records
+
+def show_video_timeline(video_file):
+    """Show the per-segment species timeline of a clip, classifying it once per upload."""
+    if st.session_state.get("video_id") != video_file.file_id:
+        st.session_state.video_records = classify_video_upload(video_file)
+        st.session_state.video_id = video_file.file_id
+    records = st.session_state.video_records
+
+    classified = sum(r["classified"] for r in records)
+    st.write(f"Classified {classified} of {len(records)} sampled frames; unchanged frames reused the previous result.")
+    rows = []
+    for segment in build_timeline(records):
+        ranks = segment["taxonomy"] or {}
+        rows.append({
+            "Start (s)": round(segment["start_s"], 1),
+            "End (s)": round(segment["end_s"], 1),
+            "Species": segment["species"],
+            "Confidence": "n/a" if segment["mean_confidence"] is None else f"{segment['mean_confidence']*100:.2f}%",
+            "Order": ranks.get("order"),
+            "Family": ranks.get("family"),
+            "Genus": ranks.get("genus"),
+            "Needs clarification": segment["needs_clarification"],
+        })
+    st.subheader("Species Timeline")
+    st.dataframe(rows)
 
-    # ---------- Q1 ----------
-    st.session_state.qa_answers["wings_visible"] = st.radio(
-        "Q1: Does the insect have visible wings?",
-        ["Select...", "yes", "no", "unknown"],
-        key="wings_visible_q"
-    )
+# --- Streamlit-compatible ask_questions function ---
+def ask_questions_streamlit():
+    """Show the full questionnaire; return the answers once submitted for the current upload, else None."""
 
-    # ---------- WING QUESTIONS ----------
-    if st.session_state.qa_answers["wings_visible"] == "yes":
+    if not st.session_state.show_questions:
+        return None
 
-        st.session_state.qa_answers["num_wings"] = st.radio(
-            "Q2: How many distinct wings visible?",
-            ["Select...", "2", "4", "more", "unknown"],
-            key="num_wings_q"
-        )
+    clarification_questionnaire()
 
-        st.session_state.qa_answers["transparent_wings"] = st.radio(
-            "Q3: Wings transparent or opaque?",
-            ["Select...", "transparent", "opaque", "unknown"],
-            key="transparent_wings_q"
-        )
+    if st.session_state.qa_submitted_id == st.session_state.clarify_id:
+        return st.session_state.qa_answers
+    return None
 
-        st.session_state.qa_answers["wing_color_pattern"] = st.radio(
-            "Q4: Wing color pattern",
-            [
-                "black with white spots",
-                "orange with black border and white spots",
-                "clear",
-                "golden tint",
-                "other/unknown"
-            ],
-            key="wing_color_pattern_q"
-        )
+# Questions whose "yes" opens follow-ups (wings, antennae)
+GATING_KEYS = {question.depends_on for question in QUESTIONS if question.depends_on is not None}
 
-        st.session_state.qa_answers["resting_position"] = st.radio(
-            "Q5: Wing resting position",
-            ["Select...", "flat over body", "tent-like", "vertically upright", "outstretched", "other/unknown"],
-            key="resting_position_q"
-        )
+@st.fragment
+def clarification_questionnaire():
+    """Gating questions sit outside the form, so changing one re-renders only
+    this fragment to show or hide its follow-ups. Every other answer stays in
+    the browser until "Submit Clarification", which reruns the app once.
+    """
+    st.subheader("Please answer the following questions to help identify the insect:")
 
-    else:
-        st.session_state.qa_answers["num_wings"] = "n/a"
-        st.session_state.qa_answers["transparent_wings"] = "n/a"
-        st.session_state.qa_answers["wing_color_pattern"] = "n/a"
-        st.session_state.qa_answers["resting_position"] = "n/a"
-
-    # ---------- BODY ----------
-    st.session_state.qa_answers["body_color"] = st.radio(
-        "Q6: Body color",
-        ["Select...", "red", "brown", "black", "green", "yellow", "orange", "other/unknown"],
-        key="body_color_q"
-    )
-
-    st.session_state.qa_answers["body_texture_appearance"] = st.radio(
-        "Q7: Body texture",
-        ["Select...", "hard and shiny", "soft", "hairy/furry",
-         "elongated with narrow middle part", "elongated and slender", "other/unknown"],
-        key="body_texture_q"
-    )
-
-    st.session_state.qa_answers["num_legs"] = st.radio(
-        "Q8: Number of legs",
-        ["Select...", "6", "8", "more", "n/a", "unknown"],
-        key="num_legs_q"
-    )
-
-    # ---------- ANTENNA ----------
-    st.session_state.qa_answers["antennae_present"] = st.radio(
-        "Q9: Antennae visible?",
-        ["Select...", "yes", "no", "unknown"],
-        key="antennae_present_q"
-    )
-
-    if st.session_state.qa_answers["antennae_present"] == "yes":
-
-        st.session_state.qa_answers["antennae_shape"] = st.radio(
-            "Q10: Antennae shape",
-            ["Select...", "clubbed", "thread-like", "bent", "very long", "small", "3 spikes", "other", "unknown"],
-            key="antennae_shape_q"
-        )
+    gates = {
+        question.key: st.radio(question.text, question.options, key=question.widget_key)
+        for question in QUESTIONS if question.key in GATING_KEYS
+    }
 
-        st.session_state.qa_answers["antennae_color"] = st.radio(
-            "Q11: Antennae color",
-            ["Select...", "black", "brown", "orange", "other/unknown"],
-            key="antennae_color_q"
+    with st.form("clarification_form"):
+        answers = {}
+        for question in QUESTIONS:
+            if question.key in gates:
+                answers[question.key] = gates[question.key]
+            # Follow-up questions only apply when their gating question was answered "yes"
+            elif question.depends_on is not None and gates[question.depends_on] != "yes":
+                answers[question.key] = NOT_APPLICABLE
+            else:
+                answers[question.key] = st.radio(question.text, question.options, key=question.widget_key)
+
+        # ---------- SUBMIT ----------
+        submitted = st.form_submit_button("Submit Clarification")
+
+    if submitted:
+        st.session_state.qa_answers = answers
+        st.session_state.qa_submitted_id = st.session_state.clarify_id
+        # The identification is shown outside this fragment
+        st.rerun()
+
+# --- Adaptive questionnaire ---
+@st.cache_resource
+def get_question_selector():
+    return QuestionSelector()
+
+def ask_adaptive_questions():
+    """Ask only the questions that best separate the model's candidates, one at a time.
+
+    The radio widgets hold the answers: each run replays them in order, so
+    changing an earlier answer re-plans the questions that follow it.
+    Returns the answers once nothing is left to ask: either a species has
+    passed the threshold with no other species still matching every answer,
+    or no remaining question is informative enough. The caller checks which
+    with ``QuestionSelector.settled``. Returns None while a question is unanswered.
+    """
+    selector = get_question_selector()
+    probabilities = st.session_state.initial_predictions
+
+    st.subheader("Please answer a few questions to help identify the insect:")
+
+    answers = {}
+    while (question := selector.next_question(probabilities, answers)) is not None:
+        species, probability = selector.best(probabilities, answers)
+        st.caption(f"Current best guess: {species.title()} ({probability*100:.0f}%)")
+        choice = st.radio(
+            question.text,
+            [option for option in question.options if option != UNANSWERED],
+            index=None,
+            key=f"adaptive_{st.session_state.clarify_id}_{question.key}"
         )
+        if choice is None:
+            return None
+        answers[question.key] = choice
 
-    else:
-        st.session_state.qa_answers["antennae_shape"] = "n/a"
-        st.session_state.qa_answers["antennae_color"] = "n/a"
-
-    # ---------- EYES ----------
-    st.session_state.qa_answers["eye_color"] = st.radio(
-        "Q12: Eye color",
-        ["Select...", "dark", "red", "yellow", "brown", "green", "other", "n/a", "unknown"],
-        key="eye_color_q"
-    )
-
-    # ---------- SUBMIT ----------
-    if st.button("Submit Clarification"):
-        return st.session_state.qa_answers
+    return answers
 
-    return None           
-    
-# --- rule_based_identification function (adapted to new question structure) ---
-def rule_based_identification(ans):
-    def contains_any(user_answer, keywords):
-        if not isinstance(user_answer, str):
-            user_answer = str(user_answer)
-        return any(keyword.lower() in user_answer.lower() for keyword in keywords)
-
-    # WANDERING GLIDER
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["4", "more", "unknown"]) and
-        (ans["transparent_wings"] == "transparent" or contains_any(ans["wing_color_pattern"], ["clear", "golden tint"])) and
-        ans["resting_position"] == "outstretched" and
-        (contains_any(ans["body_color"], ["brown", "reddish-brown", "yellow", "orange", "other"]) or ans["body_color"] == "unknown") and
-        (ans["body_texture_appearance"] == "elongated and slender" or ans["body_texture_appearance"] == "other" or ans["body_texture_appearance"] == "unknown") and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        (ans["antennae_present"] == "no" or ans["antennae_present"] == "unknown" or (ans["antennae_present"] == "yes" and ans["antennae_shape"] == "small")) and
-        (contains_any(ans["eye_color"], ["dark", "red", "brown", "yellow", "green", "other"]) or ans["eye_color"] == "unknown")
-    ):
-        return "WANDERING GLIDER"
-
-    # COMMON CROW BUTTERFLY
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["4", "2", "unknown"]) and
-        ans["transparent_wings"] == "opaque" and
-        contains_any(ans["wing_color_pattern"], ["black with white spots", "black", "white spots"]) and
-        ans["resting_position"] == "vertically upright" and
-        contains_any(ans["body_color"], ["black", "dark"]) and
-        (ans["body_texture_appearance"] in ["soft", "hairy/furry", "unknown"]) and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and
-        (ans["antennae_shape"] == "clubbed" or ans["antennae_shape"] == "unknown") and ans["antennae_color"] == "black"
-    ):
-        return "COMMON CROW BUTTERFLY"
-
-    # PLAIN TIGER BUTTERFLY
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["4", "2", "unknown"]) and
-        ans["transparent_wings"] == "opaque" and
-        contains_any(ans["wing_color_pattern"], ["orange with black border and white spots", "orange", "black border", "white spots"]) and
-        ans["resting_position"] == "vertically upright" and
-        contains_any(ans["body_color"], ["orange", "brownish-orange"]) and
-        (ans["body_texture_appearance"] in ["soft", "hairy/furry", "unknown"]) and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and (ans["antennae_shape"] in ["clubbed", "other", "thread-like"]) and ans["antennae_color"] == "black"
-    ):
-        return "PLAIN TIGER BUTTERFLY"
-
-    # SUNDOWNER MOTH
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["2", "4", "unknown"]) and
-        ans["transparent_wings"] == "opaque" and
-        contains_any(ans["wing_color_pattern"], ["brownish with dark patches", "brown", "grey", "dark patches", "subtle", "uniform", "other", "unknown"]) and
-        (ans["resting_position"] in ["flat over body", "tent-like", "unknown"]) and
-        (contains_any(ans["body_color"], ["brown", "grey", "black"]) or ans["body_color"] == "unknown") and
-        ans["body_texture_appearance"] == "hairy/furry" and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and (ans["antennae_shape"] in ["thread-like", "other", "unknown"]) and
-        (contains_any(ans["antennae_color"], ["brown", "black"]) or ans["antennae_color"] == "unknown")
-    ):
-        return "SUNDOWNER MOTH"
-
-    # TROPICAL TIGER MOTH
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["2", "4", "unknown"]) and
-        ans["transparent_wings"] == "opaque" and
-        contains_any(ans["wing_color_pattern"], ["orange and yellow", "striped", "spots", "yellow", "orange", "black"]) and
-        (ans["resting_position"] in ["tent-like", "flat over body", "unknown"]) and
-        contains_any(ans["body_color"], ["yellow", "orange"]) and # Adjusted to match provided images better
-        ans["body_texture_appearance"] == "hairy/furry" and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and (ans["antennae_shape"] in ["thread-like", "other", "unknown"]) and
-        (contains_any(ans["antennae_color"], ["black", "brown"]) or ans["antennae_color"] == "unknown")
-    ):
-        return "TROPICAL TIGER MOTH"
-
-    # ORIENTAL BEETLE
-    if (
-        (ans["wings_visible"] == "yes" or ans["wings_visible"] == "no") and # Wings may not be prominent
-        (ans["num_wings"] in ["2", "unknown", "n/a"]) and # Hardened forewings cover hindwings, appearing as 2
-        (ans["transparent_wings"] == "opaque" or ans["transparent_wings"] == "transparent") and # Elytra opaque, hindwings transparent
-        contains_any(ans["wing_color_pattern"], ["brown", "metallic", "darker brown", "other", "unknown"]) and
-        ans["resting_position"] == "flat over body" and
-        contains_any(ans["body_color"], ["brown", "green", "black", "metallic", "other", "unknown"]) and
-        ans["body_texture_appearance"] == "hard and shiny" and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and (contains_any(ans["antennae_shape"], ["clubbed", "lamellate", "other"]) or ans["antennae_shape"] == "unknown") and
-        (contains_any(ans["antennae_color"], ["brown", "black"]) or ans["antennae_color"] == "unknown")
-    ):
-        return "ORIENTAL BEETLE"
-
-    # INDIAN RED BUG
-    if (
-        (ans["wings_visible"] == "yes" or ans["wings_visible"] == "no") and # Some are apterous, others winged
-        (ans["num_wings"] in ["2", "unknown", "n/a"]) and
-        ans["transparent_wings"] == "opaque" and
-        contains_any(ans["wing_color_pattern"], ["red with black spots", "red", "black spots", "uniform"]) and
-        ans["resting_position"] == "flat over body" and
-        contains_any(ans["body_color"], ["red", "orange"]) and
-        ans["body_texture_appearance"] == "soft" and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and ans["antennae_shape"] == "thread-like" and ans["antennae_color"] == "black"
-    ):
-        return "INDIAN RED BUG"
-
-    # INDIAN BEAN BUG
-    if (
-        (ans["wings_visible"] == "yes" or ans["wings_visible"] == "no") and # Usually winged, but not always visible
-        (ans["num_wings"] in ["2", "unknown", "n/a"]) and
-        ans["transparent_wings"] == "opaque" and
-        contains_any(ans["wing_color_pattern"], ["brown", "uniform", "subtle", "other", "unknown"]) and
-        ans["resting_position"] == "flat over body" and
-        contains_any(ans["body_color"], ["brown", "dark brown", "other", "unknown"]) and
-        ans["body_texture_appearance"] == "elongated and slender" and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and ans["antennae_shape"] == "thread-like" and ans["antennae_color"] == "brown"
-    ):
-        return "INDIAN BEAN BUG"
-
-    # INDIAN POTTER WASP
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["2", "4", "unknown"]) and # Appears as 2, technically 4
-        ans["transparent_wings"] == "transparent" and
-        (contains_any(ans["wing_color_pattern"], ["clear", "smoky"]) or ans["wing_color_pattern"] == "unknown") and
-        (ans["resting_position"] in ["flat over body", "other", "unknown"]) and
-        contains_any(ans["body_color"], ["black", "yellow", "orange", "other"]) and
-        ans["body_texture_appearance"] == "elongated with narrow middle part" and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and (contains_any(ans["antennae_shape"], ["bent", "elbowed", "other", "3 spikes"]) or ans["antennae_shape"] == "unknown") and # Added 3 spikes for robustness
-        (contains_any(ans["antennae_color"], ["yellow", "black"]) or ans["antennae_color"] == "yellow" or ans["antennae_color"] == "unknown")
-    ):
-        return "INDIAN POTTER WASP"
-
-    # SLENDER MEADOW KATYDID
-    if (
-        ans["wings_visible"] == "yes" and
-        (ans["num_wings"] in ["2", "unknown"]) and
-        (ans["transparent_wings"] == "opaque" or ans["transparent_wings"] == "transparent") and
-        (contains_any(ans["wing_color_pattern"], ["green", "brown", "greenish"]) or ans["wing_color_pattern"] == "unknown") and
-        ans["resting_position"] == "flat over body" and # Often held flat or tent-like
-        (contains_any(ans["body_color"], ["green", "brown", "other"]) or ans["body_color"] == "unknown") and
-        (ans["body_texture_appearance"] in ["soft", "elongated and slender", "other", "unknown"]) and
-        (ans["num_legs"] in ["6", "unknown"]) and
-        ans["antennae_present"] == "yes" and (ans["antennae_shape"] in ["very long", "thread-like", "other", "unknown"]) and
-        (contains_any(ans["antennae_color"], ["black", "brown"]) or ans["antennae_color"] == "unknown")
-    ):
-        return "SLENDER MEADOW KATDID"
-    else:
-       return "UNCERTAIN_SPECIES"
-    
 # --- Streamlit App Structure ---
-st.title("Insect Identification with AI and Human Clarification")
-st.write("Upload an image of an insect. The AI will predict the species. If confidence is low, human clarification will be requested.")
+# st.stop() and st.rerun() end a run by raising, so record its time on the way out
+try:
+    st.title("Insect Identification with AI and Human Clarification")
+    st.write("Upload an image of an insect. The AI will predict the species. If confidence is low, human clarification will be requested.")
 
-uploaded_file = st.file_uploader("Choose an image...", type=["jpg","jpeg","png"])
+    batch_mode = st.toggle("Batch mode (upload multiple images)", key="batch_mode")
+    video_mode = st.toggle("Video mode (camera-trap clips)", key="video_mode")
 
-if uploaded_file is not None:
+    with st.sidebar.expander("Inference scheduler"):
+        st.json(scheduler.stats())
 
-    # Display uploaded image
-    st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
-    st.write("Classifying...")
+    if INFERENCE_WORKERS and model_loader.ready():
+        with st.sidebar.expander("Inference workers"):
+            st.json(get_model()[0].stats())
 
-    # Convert uploaded image to array
-    file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-    img = cv2.imdecode(file_bytes, 1)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    img_resized = cv2.resize(img, (IMG_HEIGHT, IMG_WIDTH))
-    img_array = np.expand_dims(img_resized, axis=0) / 255.0
+    if cascade is not None:
+        with st.sidebar.expander("Model cascade"):
+            st.json(cascade.stats())
 
-    # Predict using model
-    predictions = model.predict(img_array)
-    pred_index = np.argmax(predictions)
+    if prediction_store is not None:
+        with st.sidebar.expander("Prediction store"):
+            st.json(prediction_store.stats())
 
-    st.session_state.initial_confidence = float(np.max(predictions))
-    st.session_state.initial_pred_class = class_names[pred_index]
+    if get_embedding_index() is not None and (INFERENCE_WORKERS or MODEL_BACKEND != "keras"):
+        st.sidebar.caption("Similar specimens are off: they need the Keras model running in the app process, "
+                           "not the TFLite backend or inference workers.")
 
-    st.write(f"Confidence: {st.session_state.initial_confidence*100:.2f}%")
+    if st.sidebar.checkbox("Show timings", key="show_timings"):
+        timings_panel = st.sidebar.empty()
+    else:
+        timings_panel = None
 
-   # ---------- HITL TRIGGER ----------
+    # Startup breakdown for diagnosing cold starts: ?debug=1 or INSECT_DEBUG=1
+    if st.query_params.get("debug") == "1" or os.environ.get("INSECT_DEBUG") == "1":
+        with st.sidebar.expander("Startup timings", expanded=True):
+            if not model_loader.ready():
+                st.caption("Model still loading...")
+            st.json(model_loader.timer.breakdown())
 
-# Initialize state variable once
-    if "show_questions" not in st.session_state:
+    uploaded_file = None
+    if video_mode:
         st.session_state.show_questions = False
-
-
-# LOW CONFIDENCE → trigger questions
-    if st.session_state.initial_confidence < 0.95:
-        st.write(f"Predicted: {st.session_state.initial_pred_class}")
-        st.warning("Low confidence — Human clarification required")
-
-    # turn ON questions permanently
-        st.session_state.show_questions = True
-
-# ---------- HIGH CONFIDENCE DIRECT DISPLAY ----------
+        video_file = st.file_uploader("Choose a video...", type=VIDEO_TYPES)
+        if video_file is not None:
+            st.video(video_file)
+            show_video_timeline(video_file)
+    elif batch_mode:
+        uploaded_files = st.file_uploader("Choose images...", type=["jpg","jpeg","png"], accept_multiple_files=True)
+        if uploaded_files:
+            show_batch_results(uploaded_files)
+        else:
+            st.session_state.show_questions = False
     else:
-        st.session_state.show_questions = False
-    
-        st.subheader("AI Prediction")
-        st.write(f"Species: {st.session_state.initial_pred_class}")
-        st.write(f"Confidence: {st.session_state.initial_confidence*100:.2f}%")
+        uploaded_file = st.file_uploader("Choose an image...", type=["jpg","jpeg","png"])
 
-        taxonomy_key = st.session_state.initial_pred_class.upper()
-        if taxonomy_key in taxonomy:
-            st.subheader("Taxonomic Classification")
-            for rank, value in taxonomy[taxonomy_key].items():
-                st.write(f"**{rank}:** {value}")
+    if uploaded_file is not None:
 
-# ---------- QUESTION DISPLAY ----------
-if st.session_state.show_questions:
+        # Display uploaded image
+        st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
+        st.write("Classifying...")
 
-    user_answers = ask_questions_streamlit()
+        # Decode and predict once per distinct upload; reruns hit the cache
+        file_bytes = uploaded_file.getbuffer()
+        result = run_inference(file_bytes)
 
-    if user_answers is not None:
-        final_species = rule_based_identification(user_answers)
+        st.session_state.initial_confidence = result["initial_confidence"]
+        st.session_state.initial_pred_class = result["initial_pred_class"]
+        st.session_state.initial_predictions = result["predictions"]
+        st.session_state.clarify_id = uploaded_file.file_id
+        st.session_state.upload_key = result["key"]
+        # Identified earlier, by another session or another upload of the same image
+        previously_identified = bool(result.get("final_species")) and st.session_state.identified_key != result["key"]
 
-        st.subheader("Refined Identification")
-        st.success(final_species.title())
-
-        taxonomy_key = final_species.upper()
-        if taxonomy_key in taxonomy:
-            st.subheader("Taxonomic Classification")
-            for rank, value in taxonomy[taxonomy_key].items():
-                st.write(f"**{rank}:** {value}")
+        st.write(f"Confidence: {st.session_state.initial_confidence*100:.2f}%")
+        if result["stage"] == "store":
+            match = "this image" if result["exact_match"] else "a near-identical image"
+            st.caption(f"Reused the stored result for {match}")
+        elif previously_identified:
+            st.caption("Reused the earlier identification of this image")
+
+       # ---------- HITL TRIGGER ----------
+
+    # Initialize state variable once
+        if "show_questions" not in st.session_state:
+            st.session_state.show_questions = False
+
+
+    # PREVIOUSLY CLARIFIED → show the stored identification
+        if previously_identified:
+            st.session_state.show_questions = False
+
+            st.subheader("Previous Identification")
+            st.success(result["final_species"].title())
+
+            ranks = taxonomy(result["final_species"])
+            if ranks is not None:
+                st.subheader("Taxonomic Classification")
+                for level, value in ranks.items():
+                    st.write(f"**{level}:** {value}")
+
+    # LOW CONFIDENCE → trigger questions
+        elif st.session_state.initial_confidence < 0.95:
+            st.write(f"Predicted: {st.session_state.initial_pred_class}")
+            st.warning("Low confidence — Human clarification required")
+
+            similar = find_similar_specimens(result, file_bytes)
+            if similar:
+                st.write("Most similar verified specimens:")
+                for column, match in zip(st.columns(len(similar)), similar):
+                    with column:
+                        if os.path.exists(match["path"]):
+                            st.image(match["path"])
+                        st.caption(f"{match['species'].title()} ({match['similarity']*100:.0f}% similar)")
+
+            # Probability mass concentrated in one genus, family or order is an answer in itself
+            confident_rank = None
+            if result["predictions"] is not None:
+                confident_rank = taxonomy_rollup.deepest_confident(result["predictions"])
+            if confident_rank is not None:
+                st.subheader(f"Identified to {confident_rank['rank']}")
+                st.success(f"{confident_rank['name']} ({confident_rank['probability']*100:.2f}%)")
+                for level, value in confident_rank["lineage"].items():
+                    st.write(f"**{level}:** {value}")
+                st.caption("Answer the questions below to narrow it down to a species.")
+
+        # turn ON questions permanently
+            st.session_state.show_questions = True
+
+    # ---------- HIGH CONFIDENCE DIRECT DISPLAY ----------
+        else:
+            st.session_state.show_questions = False
+
+            st.subheader("AI Prediction")
+            st.write(f"Species: {st.session_state.initial_pred_class}")
+            st.write(f"Confidence: {st.session_state.initial_confidence*100:.2f}%")
+            if cascade is not None and result["stage"] == "fast":
+                st.caption("Answered by the fast model")
+
+            ranks = taxonomy(st.session_state.initial_pred_class)
+            if ranks is not None:
+                st.subheader("Taxonomic Classification")
+                for level, value in ranks.items():
+                    st.write(f"**{level}:** {value}")
+
+    # ---------- QUESTION DISPLAY ----------
+    if st.session_state.show_questions:
+
+        full_questionnaire = st.toggle("Answer all questions at once", key="full_questionnaire")
+
+        final_species, probability = None, None
+        if full_questionnaire or st.session_state.initial_predictions is None:
+            METRICS.inc("questionnaire_runs_total", mode="full")
+            with METRICS.timer("questionnaire_render"):
+                user_answers = ask_questions_streamlit()
+            if user_answers is not None:
+                with METRICS.timer("rules"):
+                    final_species = identify(user_answers)
+        else:
+            METRICS.inc("questionnaire_runs_total", mode="adaptive")
+            with METRICS.timer("questionnaire_render"):
+                user_answers = ask_adaptive_questions()
+            if user_answers is not None:
+                with METRICS.timer("rules"):
+                    selector = get_question_selector()
+                    final_species, probability = selector.best(st.session_state.initial_predictions, user_answers)
+                    settled = selector.settled(st.session_state.initial_predictions, user_answers)
+                # Questions ran out before the front-runner passed the threshold
+                # or ruled out every rival: it is only a guess
+                if not settled:
+                    final_species = UNCERTAIN_SPECIES
+
+        if final_species is not None and final_species != UNCERTAIN_SPECIES:
+            record_identification(st.session_state.upload_key, user_answers, final_species)
+
+        if final_species is not None:
+            st.subheader("Refined Identification")
+            st.success(final_species.title())
+
+            if probability is not None and final_species != UNCERTAIN_SPECIES:
+                st.write(f"Confidence: {probability*100:.2f}% after {len(user_answers)} question(s)")
+
+            # No species matched every answer, or none became likely enough: offer the closest instead
+            if final_species == UNCERTAIN_SPECIES:
+                st.write("Closest matches:")
+                if probability is None:
+                    for species, score in rank(user_answers)[:3]:
+                        st.write(f"- {species.title()}: {score*100:.0f}% of traits matched")
+                else:
+                    ranked = get_question_selector().ranked(st.session_state.initial_predictions, user_answers)
+                    for species, likelihood in ranked[:3]:
+                        st.write(f"- {species.title()}: {likelihood*100:.0f}% likely "
+                                 f"after {len(user_answers)} question(s)")
+
+            ranks = taxonomy(final_species)
+            if ranks is not None:
+                st.subheader("Taxonomic Classification")
+                for level, value in ranks.items():
+                    st.write(f"**{level}:** {value}")
+finally:
+    METRICS.observe("script_run", time.perf_counter() - run_started)
+
+# ---------- TIMING PANEL ----------
+if timings_panel is not None:
+    with timings_panel.container():
+        st.caption("Per-stage latency (this process)")
+        st.table({
+            stage: {name: round(value, 2) for name, value in stats.items()}
+            for stage, stats in METRICS.stage_summary().items()
+        })
+        for (name, labels), value in sorted(METRICS.counters().items()):
+            label_text = ", ".join(f"{key}={val}" for key, val in labels)
+            st.write(f"{name}{{{label_text}}}: {value:g}")
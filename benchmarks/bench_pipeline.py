@@ -0,0 +1,216 @@
+"""Benchmarks for the decode -> preprocess -> predict -> rules pipeline.
+
+Runs fully offline: images are synthesised at several resolutions, and when
+INSECT_CNN_FINAL.keras isn't present a small stand-in Keras model with the
+same input and output shapes is used instead. Results are written as JSON;
+pass ``--baseline`` to fail (exit status 1) when any benchmark's median is
+slower than the baseline by more than ``--max-regression``.
+
+Usage::
+
+    python benchmarks/bench_pipeline.py --output bench_results.json
+    python benchmarks/bench_pipeline.py --baseline bench_results.json --max-regression 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from insect_id import (  # noqa: E402
+    CLASS_NAMES,
+    ENGINE,
+    IMG_HEIGHT,
+    IMG_WIDTH,
+    MODEL_PATH,
+    QUESTIONS,
+    identify,
+    load_model,
+    make_predictor,
+    preprocess,
+)
+from insect_id.config import SCHEDULER_MAX_BATCH_SIZE  # noqa: E402
+from insect_id.questions import answer_values  # noqa: E402
+
+RESOLUTIONS = [(640, 480), (1920, 1080), (4032, 3024), (8000, 6000)]
+BATCH_SIZES = [8, 32]
+# Batch sizes the micro-batching scheduler coalesces concurrent single-image requests into
+COALESCED_BATCH_SIZES = [2, 4, SCHEDULER_MAX_BATCH_SIZE]
+
+
+def measure(fn, repeats, warmup=1):
+    """Median, p90 and min wall time of ``fn`` in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+    times = np.asarray(times)
+    return {
+        "median_ms": float(np.median(times)),
+        "p90_ms": float(np.percentile(times, 90)),
+        "min_ms": float(times.min()),
+        "repeats": repeats,
+    }
+
+
+def synthetic_jpeg(width, height, seed=0):
+    """A smooth random photo-like JPEG; noise-free so the encoded size is realistic."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    small = (rng.random((max(height // 64, 2), max(width // 64, 2), 3)) * 255).astype(np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+def legacy_preprocess(file_bytes):
+    """The original app.py upload path, kept as a fixed reference point."""
+    import cv2
+
+    file_bytes = np.asarray(bytearray(file_bytes), dtype=np.uint8)
+    img = cv2.imdecode(file_bytes, 1)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img_resized = cv2.resize(img, (IMG_HEIGHT, IMG_WIDTH))
+    return np.expand_dims(img_resized, axis=0) / 255.0
+
+
+def stand_in_model():
+    """Small CNN with the production model's input shape and class count."""
+    import keras
+
+    keras.utils.set_random_seed(0)
+    return keras.Sequential([
+        keras.Input((IMG_HEIGHT, IMG_WIDTH, 3)),
+        keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        keras.layers.Conv2D(32, 3, strides=2, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(64, activation="relu"),
+        keras.layers.Dense(len(CLASS_NAMES), activation="softmax"),
+    ])
+
+
+def random_answers(count, seed=0):
+    rng = random.Random(seed)
+    values = {question.key: answer_values(question) for question in QUESTIONS}
+    return [{key: rng.choice(options) for key, options in values.items()} for _ in range(count)]
+
+
+def bench_decode(results, repeats):
+    for width, height in RESOLUTIONS:
+        data = synthetic_jpeg(width, height)
+        label = f"{width}x{height}"
+        results[f"decode/legacy/{label}"] = measure(lambda: legacy_preprocess(data), repeats)
+        results[f"decode/preprocess/{label}"] = measure(lambda: preprocess(data), repeats)
+
+
+def bench_predict(results, repeats, model_path):
+    if model_path and os.path.exists(model_path):
+        model, model_name = load_model(model_path, backend="keras"), model_path
+    else:
+        model, model_name = stand_in_model(), "stand-in"
+
+    rng = np.random.default_rng(0)
+    single = rng.random((1, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+    results["predict/model.predict/batch1"] = measure(lambda: model.predict(single, verbose=0), repeats)
+    predictor = make_predictor(model)
+    results["predict/single_image/batch1"] = measure(lambda: predictor(single), repeats)
+    for batch_size in BATCH_SIZES:
+        batch = rng.random((batch_size, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        results[f"predict/model.predict/batch{batch_size}"] = measure(lambda: model.predict(batch, verbose=0), repeats)
+        results[f"predict/compiled/batch{batch_size}"] = measure(lambda: predictor(batch), repeats)
+
+    # What the scheduler saves: one forward pass over a coalesced batch versus
+    # a pass per request, both through the compiled predictor the app serves with
+    for batch_size in COALESCED_BATCH_SIZES:
+        batch = rng.random((batch_size, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        results[f"predict/coalesced/batch{batch_size}"] = measure(lambda: predictor(batch), repeats)
+        results[f"predict/single_calls/batch{batch_size}"] = measure(
+            lambda: [predictor(batch[i:i + 1]) for i in range(batch_size)], repeats)
+    return model_name
+
+
+def bench_rules(results, repeats, count):
+    answers = random_answers(count)
+    results[f"rules/identify/{count}"] = measure(lambda: [identify(ans) for ans in answers], repeats)
+    results[f"rules/identify_many/{count}"] = measure(lambda: ENGINE.identify_many(answers), repeats)
+    results[f"rules/match_fractions/{count}"] = measure(lambda: ENGINE.match_fractions(answers), repeats)
+
+
+def find_regressions(results, baseline, max_regression):
+    """Benchmarks whose median grew by more than ``max_regression`` (a fraction) over the baseline."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        ratio = current["median_ms"] / previous["median_ms"]
+        if ratio > 1 + max_regression:
+            regressions.append((name, previous["median_ms"], current["median_ms"], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON results path (default: bench_results.json).")
+    parser.add_argument("-m", "--model", default=MODEL_PATH, help="Model to benchmark; a stand-in is used if it doesn't exist.")
+    parser.add_argument("-r", "--repeats", type=int, default=10, help="Timed runs per benchmark (default: 10).")
+    parser.add_argument("--answers", type=int, default=10000, help="Generated answer dicts for the rule benchmarks (default: 10000).")
+    parser.add_argument("--only", choices=("decode", "predict", "rules"), action="append", help="Run only these groups.")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed median slowdown versus the baseline, as a fraction (default: 0.2).")
+    args = parser.parse_args(argv)
+    groups = args.only or ["decode", "predict", "rules"]
+
+    results = {}
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    if "decode" in groups:
+        bench_decode(results, args.repeats)
+    if "predict" in groups:
+        meta["model"] = bench_predict(results, args.repeats, args.model)
+    if "rules" in groups:
+        bench_rules(results, args.repeats, args.answers)
+
+    with open(args.output, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    width = max(map(len, results))
+    for name, stats in results.items():
+        print(f"{name:<{width}}  median {stats['median_ms']:>10.2f} ms  p90 {stats['p90_ms']:>10.2f} ms")
+    for batch_size in COALESCED_BATCH_SIZES:
+        coalesced = results.get(f"predict/coalesced/batch{batch_size}")
+        singles = results.get(f"predict/single_calls/batch{batch_size}")
+        if coalesced and singles:
+            print(f"Coalescing {batch_size} requests: {singles['median_ms'] / coalesced['median_ms']:.2f}x "
+                  f"faster than {batch_size} single calls")
+    print(f"Wrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.max_regression)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+"""Concurrent-session load test for app.py, driven headlessly through Streamlit's AppTest.
+
+Each simulated session is its own AppTest (its own session state) running in
+a thread of this process, so sessions share one set of ``st.cache_resource``
+objects (model, scheduler, caches) exactly as users of one replica do. A
+session uploads synthetic photos one after another and, whenever the app
+asks for clarification, answers the questionnaire with random choices.
+
+The model is replaced by a stub that sleeps for a configurable time per
+batch and returns a confident prediction for a configurable share of
+images, so results measure the app and its scheduling rather than a model.
+For every concurrency level the harness reports identification throughput,
+p50/p95/p99 latency of single script runs and of whole identifications
+(upload to final answer), and resident memory per session.
+
+Usage::
+
+    python benchmarks/load_test.py --sessions 1 4 16 --uploads 3 --model-latency-ms 40
+    python benchmarks/load_test.py --sessions 8 --questionnaire full --output load_results.json
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from unittest import mock
+
+import numpy as np
+import streamlit as st
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.util import patch_config_options
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Read by insect_id.config on import: no stored predictions to short-circuit
+# inference between runs, and inference in this process, where the stub lives
+os.environ.setdefault("INSECT_PREDICTION_STORE", "")
+os.environ["INSECT_INFERENCE_WORKERS"] = "0"
+
+import insect_id  # noqa: E402
+from insect_id import CLASS_NAMES, CONFIDENCE_THRESHOLD, METRICS, QUESTIONS, UNANSWERED  # noqa: E402
+
+from bench_pipeline import synthetic_jpeg  # noqa: E402
+
+APP_PATH = os.path.join(ROOT, "app.py")
+# Session-state key the patched uploader reads this session's current upload from
+UPLOAD_STATE_KEY = "_load_test_upload"
+# The full questionnaire asks gating questions outside its form and the rest inside it
+GATE_WIDGET_KEYS = {
+    question.widget_key for question in QUESTIONS
+    if question.key in {follow_up.depends_on for follow_up in QUESTIONS}
+}
+FORM_WIDGET_KEYS = {question.widget_key for question in QUESTIONS} - GATE_WIDGET_KEYS
+
+
+class StubModel:
+    """Stands in for the classifier: sleeps, then returns deterministic probabilities.
+
+    Each image's prediction is seeded by its pixels, so the same upload gets
+    the same answer. ``low_confidence`` of images get a spread-out vector
+    below CONFIDENCE_THRESHOLD; the rest a confident one.
+    """
+
+    def __init__(self, batch_latency_ms=40.0, image_latency_ms=2.0, low_confidence=0.5):
+        self.batch_latency = batch_latency_ms / 1000.0
+        self.image_latency = image_latency_ms / 1000.0
+        self.low_confidence = low_confidence
+
+    def _probabilities(self, image):
+        rng = np.random.default_rng(zlib.crc32(image.tobytes()))
+        if rng.random() < self.low_confidence:
+            probabilities = rng.dirichlet(np.ones(len(CLASS_NAMES)))
+            probabilities = np.minimum(probabilities, CONFIDENCE_THRESHOLD / 2)
+        else:
+            probabilities = np.full(len(CLASS_NAMES), 0.001)
+            probabilities[rng.integers(len(CLASS_NAMES))] = 1.0
+        return (probabilities / probabilities.sum()).astype(np.float32)
+
+    def predict(self, images, verbose=0):
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        # Sleeping releases the GIL, as TensorFlow does while it computes
+        time.sleep(self.batch_latency + self.image_latency * len(images))
+        return np.stack([self._probabilities(image) for image in images])
+
+    __call__ = predict
+
+    def warm_up(self, runs=1):
+        pass
+
+
+class Upload(io.BytesIO):
+    """Just enough of Streamlit's UploadedFile for app.py."""
+
+    def __init__(self, data, file_id):
+        super().__init__(data)
+        self.file_id = file_id
+        self.name = f"{file_id}.jpg"
+        self.type = "image/jpeg"
+
+
+def rss_bytes():
+    """Resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak rather than current RSS; kilobytes on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentiles(values):
+    if not values:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "count": 0}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000.0, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "count": len(values)}
+
+
+class Session:
+    """One simulated user: an AppTest plus the timings of everything it did."""
+
+    def __init__(self, session_id, args):
+        self.session_id = session_id
+        self.args = args
+        self.rng = random.Random(args.seed + session_id)
+        self.app = AppTest.from_file(APP_PATH, default_timeout=args.timeout)
+        self.run_seconds = []
+        self.identification_seconds = []
+        self.clarified = 0
+        self.errors = []
+
+    def _run(self):
+        start = time.perf_counter()
+        self.app.run()
+        self.run_seconds.append(time.perf_counter() - start)
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].message)
+
+    def _answer(self, radio):
+        radio.set_value(self.rng.choice([option for option in radio.options if option != UNANSWERED]))
+
+    def _answer_adaptive(self):
+        for _ in QUESTIONS:
+            pending = [radio for radio in self.app.radio
+                       if radio.key and radio.key.startswith("adaptive_") and radio.value is None]
+            if not pending:
+                return
+            self._answer(pending[0])
+            self._run()
+
+    def _answer_full(self):
+        toggle = self.app.toggle(key="full_questionnaire")
+        if not toggle.value:
+            toggle.set_value(True)
+            self._run()
+        # Each gating answer re-renders the questionnaire to show or hide its follow-ups
+        for radio in [radio for radio in self.app.radio if radio.key in GATE_WIDGET_KEYS]:
+            self._answer(radio)
+            self._run()
+        for radio in self.app.radio:
+            if radio.key in FORM_WIDGET_KEYS:
+                self._answer(radio)
+        next(button for button in self.app.button if button.label == "Submit Clarification").click()
+        self._run()
+
+    def identify(self, upload):
+        width, height = self.args.resolution
+        seed = self.args.seed * 1_000_003 + self.session_id * 1000 + upload
+        file_id = f"session{self.session_id}-upload{upload}"
+        self.app.session_state[UPLOAD_STATE_KEY] = (synthetic_jpeg(width, height, seed=seed), file_id)
+        start = time.perf_counter()
+        try:
+            self._run()
+            if self.app.session_state["show_questions"]:
+                self.clarified += 1
+                if self.args.questionnaire == "full":
+                    self._answer_full()
+                else:
+                    self._answer_adaptive()
+        except Exception as e:
+            self.errors.append(repr(e))
+            return
+        self.identification_seconds.append(time.perf_counter() - start)
+
+    def run(self, uploads, start_barrier):
+        start_barrier.wait()
+        for upload in range(uploads):
+            self.identify(upload)
+
+
+def patched_app(args):
+    """Patch in the stub model and per-session uploads, and make AppTest safe to run from threads."""
+    model = StubModel(args.model_latency_ms, args.image_latency_ms, args.low_confidence)
+    real_file_uploader = st.file_uploader
+
+    def file_uploader(*a, **kwargs):
+        # Render the real widget so the page matches, then hand back this session's upload
+        real_file_uploader(*a, **kwargs)
+        upload = st.session_state.get(UPLOAD_STATE_KEY)
+        if upload is None:
+            return [] if kwargs.get("accept_multiple_files") else None
+        upload = Upload(*upload)
+        return [upload] if kwargs.get("accept_multiple_files") else upload
+
+    stack = ExitStack()
+    # AppTest compiles the script afresh on every run; a server compiles it once.
+    # Sharing one cache matches that, and keeps threads from parsing concurrently.
+    script_cache = ScriptCache()
+    stack.enter_context(mock.patch("streamlit.testing.v1.local_script_runner.ScriptCache", lambda: script_cache))
+
+    # AppTest also installs a mock Runtime for each run and removes it after,
+    # which breaks runs still going in other threads. A server has one Runtime
+    # per process: keep the first one AppTest creates for every session.
+    shared_runtime = []
+
+    def runtime_instance():
+        if not shared_runtime:
+            if Runtime._instance is None:
+                raise RuntimeError("Runtime hasn't been created!")
+            shared_runtime.append(Runtime._instance)
+        return shared_runtime[0]
+
+    stack.enter_context(mock.patch.object(Runtime, "instance", runtime_instance))
+    stack.enter_context(mock.patch.object(Runtime, "exists", lambda: bool(shared_runtime) or Runtime._instance is not None))
+
+    # Each run also patches config.get_option to set global.appTest and restores
+    # it afterwards, so overlapping runs unpatch each other. Set it once instead.
+    stack.enter_context(patch_config_options({"global.appTest": True}))
+    stack.enter_context(mock.patch("streamlit.testing.v1.app_test.patch_config_options", lambda overrides: nullcontext()))
+    stack.enter_context(mock.patch.object(insect_id, "load_model", lambda *a, **kwargs: model))
+    stack.enter_context(mock.patch.object(insect_id, "make_predictor", lambda model: model))
+    stack.enter_context(mock.patch.object(st, "file_uploader", file_uploader))
+    return stack
+
+
+def run_level(concurrency, args):
+    """Run ``concurrency`` sessions at once and summarise them."""
+    gc.collect()
+    rss_before = rss_bytes()
+    sessions = [Session(concurrency * 1000 + i, args) for i in range(concurrency)]
+    start_barrier = threading.Barrier(concurrency)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(lambda session: session.run(args.uploads, start_barrier), sessions))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    # Sessions are still alive here, so their state counts towards the difference
+    rss_after = rss_bytes()
+
+    run_seconds = [s for session in sessions for s in session.run_seconds]
+    identification_seconds = [s for session in sessions for s in session.identification_seconds]
+    errors = [e for session in sessions for e in session.errors]
+    # Failed identifications are missing from the latencies, which then flatter the level
+    return {
+        "sessions": concurrency,
+        "identifications": len(identification_seconds),
+        "clarified": sum(session.clarified for session in sessions),
+        "script_runs": len(run_seconds),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "valid": not errors,
+        "elapsed_s": elapsed,
+        "identifications_per_s": len(identification_seconds) / elapsed,
+        "script_runs_per_s": len(run_seconds) / elapsed,
+        "script_run_latency": percentiles(run_seconds),
+        "identification_latency": percentiles(identification_seconds),
+        "rss_mb": rss_after / (1024 * 1024),
+        "rss_per_session_mb": max(rss_after - rss_before, 0) / concurrency / (1024 * 1024),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16],
+                        help="Concurrency levels to run, in order (default: 1 2 4 8 16).")
+    parser.add_argument("-u", "--uploads", type=int, default=3, help="Identifications per session (default: 3).")
+    parser.add_argument("--questionnaire", choices=("adaptive", "full"), default="adaptive",
+                        help="How sessions answer clarification requests (default: adaptive).")
+    parser.add_argument("--model-latency-ms", type=float, default=40.0,
+                        help="Stub model time per batch (default: 40).")
+    parser.add_argument("--image-latency-ms", type=float, default=2.0,
+                        help="Stub model time per image in a batch (default: 2).")
+    parser.add_argument("--low-confidence", type=float, default=0.5,
+                        help="Share of uploads that need clarification (default: 0.5).")
+    parser.add_argument("--resolution", type=int, nargs=2, default=(1280, 960), metavar=("WIDTH", "HEIGHT"),
+                        help="Size of the synthetic uploads (default: 1280 960).")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per script run timeout in seconds (default: 120).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="load_results.json", help="JSON results path (default: load_results.json).")
+    args = parser.parse_args(argv)
+
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        **{key: value for key, value in vars(args).items() if key not in ("output", "sessions")},
+    }
+    levels = []
+    with patched_app(args):
+        # One untimed session loads the stub, starts the scheduler and fills the caches
+        warm_up = Session(0, args)
+        warm_up.run(1, threading.Barrier(1))
+        if warm_up.errors:
+            print(f"Warm-up session failed: {warm_up.errors[0]}", file=sys.stderr)
+            return 1
+
+        print(f"{'sessions':>8} {'ident/s':>8} {'runs/s':>8} {'run p50':>9} {'run p95':>9} {'run p99':>9} "
+              f"{'ident p50':>10} {'ident p95':>10} {'ident p99':>10} {'errors':>6} {'MB/sess':>8}")
+        for concurrency in args.sessions:
+            level = run_level(concurrency, args)
+            levels.append(level)
+            runs, idents = level["script_run_latency"], level["identification_latency"]
+            print(f"{concurrency:>8} {level['identifications_per_s']:>8.2f} {level['script_runs_per_s']:>8.2f} "
+                  f"{runs['p50_ms'] or 0:>9.0f} {runs['p95_ms'] or 0:>9.0f} {runs['p99_ms'] or 0:>9.0f} "
+                  f"{idents['p50_ms'] or 0:>10.0f} {idents['p95_ms'] or 0:>10.0f} {idents['p99_ms'] or 0:>10.0f} "
+                  f"{level['errors']:>6} {level['rss_per_session_mb']:>8.2f}")
+            if not level["valid"]:
+                print(f"  INVALID: {level['errors']} identification(s) failed and are left out of the latencies; "
+                      f"first error: {level['first_error']}", file=sys.stderr)
+
+    with open(args.output, "w") as f:
+        # Stage timings recorded by the app itself, over every session including the warm-up
+        json.dump({"meta": meta, "levels": levels, "stages": METRICS.stage_summary()}, f, indent=2)
+    print(f"Latencies in ms. Wrote {len(levels)} levels to {args.output}")
+    return 0 if all(level["valid"] for level in levels) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
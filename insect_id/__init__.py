@@ -0,0 +1,44 @@
+"""Headless insect classification engine shared by the Streamlit app and the CLI."""
+
+from .adaptive import QuestionSelector
+from .cache import InferenceCache
+from .cascade import ModelCascade
+from .catalog import CLASS_NAMES, TAXONOMY, check_taxonomy, label_for_path, taxonomy
+from .config import (
+    CASCADE_MODEL_PATH,
+    CASCADE_THRESHOLD,
+    CONFIDENCE_THRESHOLD,
+    EMBEDDING_INDEX_PATH,
+    IMG_HEIGHT,
+    IMG_WIDTH,
+    INFERENCE_WORKER_THREADS,
+    INFERENCE_WORKERS,
+    METRICS_FILE,
+    METRICS_PORT,
+    MODEL_BACKEND,
+    MODEL_PATH,
+    PREDICTION_STORE_PATH,
+    TFLITE_MODEL_PATH,
+)
+from .core import (
+    CompiledPredictor,
+    backend_for_path,
+    compare_single_predict,
+    load_model,
+    make_predictor,
+    make_result,
+    predict,
+)
+from .embeddings import EmbeddingIndex, FeatureExtractor, build_index
+from .hierarchy import TaxonomyRollup
+from .imaging import dhash, preprocess, preprocess_frame, thumbnail
+from .metrics import METRICS, Metrics
+from .pipeline import iter_batch_inference, load_path
+from .questions import NOT_APPLICABLE, QUESTIONS, UNANSWERED, Question
+from .rules import ENGINE, UNCERTAIN_SPECIES, RuleEngine, identify, rank
+from .scheduler import MicroBatchScheduler
+from .startup import BackgroundLoader, StartupTimer
+from .store import PredictionStore, model_fingerprint
+from .tflite import TFLiteModel
+from .video import build_timeline, classify_video, iter_video_predictions
+from .workers import InferenceWorkerPool
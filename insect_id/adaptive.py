@@ -0,0 +1,163 @@
+"""Adaptive questionnaire: ask the question that best separates the model's top candidates next.
+
+The CNN's probability vector is the prior over species. Each species' rule
+defines which answers it expects for a question; an answer it expects is
+treated as likely and any other answer as a rare mistake (ANSWER_NOISE).
+After every answer the posterior is updated, and the next question is the
+one with the highest expected information gain, until one species reaches
+CONFIDENCE_THRESHOLD with no other species still matching every answer, or
+nothing useful is left to ask; only the first is a confident identification.
+"""
+
+import logging
+
+import numpy as np
+
+from .catalog import CLASS_NAMES
+from .config import ANSWER_NOISE, CONFIDENCE_THRESHOLD
+from .questions import NOT_APPLICABLE, QUESTIONS, UNANSWERED
+from .rules import ENGINE
+
+logger = logging.getLogger(__name__)
+
+# Below this, asking another question isn't worth the round trip
+MIN_INFORMATION_GAIN = 1e-3
+
+
+def _entropy(p, axis=-1):
+    p = np.clip(p, 1e-12, 1.0)
+    return -(p * np.log2(p)).sum(axis=axis)
+
+
+class QuestionSelector:
+    """Pick questions by expected information gain over the rule engine's species."""
+
+    def __init__(self, engine=ENGINE, questions=QUESTIONS, class_names=CLASS_NAMES,
+                 threshold=CONFIDENCE_THRESHOLD, noise=ANSWER_NOISE, prior_floor=0.01):
+        self.engine = engine
+        self.questions = questions
+        self.threshold = threshold
+        self.prior_floor = prior_floor
+
+        # Map model output positions onto rule species; classes without a rule carry no weight
+        self._class_positions = [i for i, name in enumerate(class_names) if name in engine.species]
+        self._species_positions = [engine.species.index(class_names[i]) for i in self._class_positions]
+        missing = sorted(set(class_names) - set(engine.species))
+        if missing:
+            logger.warning("Model classes without identification rules: %s", missing)
+
+        # Per question: answer values and P(answer | species), shape (n_values, n_species)
+        self._likelihoods = {}
+        for question in questions:
+            values, satisfied = engine.slot_constraints(question.key)
+            keep = [i for i, value in enumerate(values) if value != UNANSWERED]
+            values = [values[i] for i in keep]
+            satisfied = satisfied[keep].astype(float)
+            expected = satisfied.sum(axis=0)
+            unexpected = len(values) - expected
+            likelihood = np.where(
+                satisfied > 0,
+                (1 - noise) / np.maximum(expected, 1),
+                noise / np.maximum(unexpected, 1),
+            )
+            # Species that accept every value learn nothing from the answer
+            likelihood[:, unexpected == 0] = 1.0 / len(values)
+            self._likelihoods[question.key] = (values, likelihood)
+
+    def prior(self, probabilities):
+        """Model probabilities re-indexed onto rule species, floored so answers can still overturn them."""
+        prior = np.zeros(len(self.engine.species))
+        probabilities = np.asarray(probabilities, dtype=float).ravel()
+        prior[self._species_positions] = probabilities[self._class_positions]
+        prior = prior + self.prior_floor
+        return prior / prior.sum()
+
+    def complete(self, answers):
+        """Copy of ``answers`` with follow-ups to gating questions not answered "yes" marked not applicable."""
+        answers = dict(answers)
+        for question in self.questions:
+            if question.depends_on in answers and answers[question.depends_on] != "yes":
+                answers.setdefault(question.key, NOT_APPLICABLE)
+        return answers
+
+    def posterior(self, probabilities, answers):
+        posterior = self.prior(probabilities)
+        for key, value in self.complete(answers).items():
+            if key not in self._likelihoods or value == UNANSWERED:
+                continue
+            values, likelihood = self._likelihoods[key]
+            if value in values:
+                posterior = posterior * likelihood[values.index(value)]
+        return posterior / posterior.sum()
+
+    def best(self, probabilities, answers):
+        """(species, posterior probability) of the current front-runner."""
+        posterior = self.posterior(probabilities, answers)
+        index = int(np.argmax(posterior))
+        return self.engine.species[index], float(posterior[index])
+
+    def ranked(self, probabilities, answers):
+        """Every species as (species, posterior probability), most likely first."""
+        posterior = self.posterior(probabilities, answers)
+        order = np.argsort(-posterior, kind="stable")
+        return [(self.engine.species[i], float(posterior[i])) for i in order]
+
+    def candidates(self, answers):
+        """Questions that can be asked now: unanswered, with any gating question answered "yes"."""
+        answers = self.complete(answers)
+        return [
+            question for question in self.questions
+            if question.key not in answers
+            and (question.depends_on is None or answers.get(question.depends_on) == "yes")
+        ]
+
+    def expected_gains(self, probabilities, answers):
+        """Expected reduction in posterior entropy, in bits, for each askable question."""
+        posterior = self.posterior(probabilities, answers)
+        current = _entropy(posterior)
+        gains = {}
+        for question in self.candidates(answers):
+            _, likelihood = self._likelihoods[question.key]
+            joint = likelihood * posterior  # (n_values, n_species)
+            evidence = joint.sum(axis=1)
+            conditional = joint / np.maximum(evidence[:, None], 1e-12)
+            gains[question.key] = float(current - (evidence * _entropy(conditional)).sum())
+        return gains
+
+    def rivals(self, species, answers):
+        """Other species whose rules every answer given so far still satisfies.
+
+        Follow-ups skipped behind a "no" don't count: the rules were written for
+        the full questionnaire and reject "n/a" where this one implies it.
+        """
+        consistent = self.engine.consistent(answers)
+        return [name for j, name in enumerate(self.engine.species) if consistent >> j & 1 and name != species]
+
+    def settled(self, probabilities, answers):
+        """Whether the front-runner has passed the threshold with no rule-consistent rival left."""
+        species, probability = self.best(probabilities, answers)
+        return probability >= self.threshold and not self.rivals(species, answers)
+
+    def next_question(self, probabilities, answers):
+        """The most informative question to ask next, or None once a species is settled.
+
+        Passing the threshold isn't enough on its own: the likelihoods reward a
+        species for each answer it expects, so a rule-consistent rival with a
+        lower prior can fall behind before the questions that separate the two
+        are asked. Those are asked first.
+        """
+        if self.settled(probabilities, answers):
+            return None
+        gains = self.expected_gains(probabilities, answers)
+        # A gating question is worth at least what the follow-ups it opens are worth
+        for question in self.candidates(answers):
+            follow_ups = [follow_up.key for follow_up in self.questions if follow_up.depends_on == question.key]
+            if follow_ups:
+                opened = self.expected_gains(probabilities, {**answers, question.key: "yes"})
+                gains[question.key] = max([gains[question.key]] + [opened.get(key, 0.0) for key in follow_ups])
+        if not gains:
+            return None
+        key = max(gains, key=gains.get)
+        if gains[key] < MIN_INFORMATION_GAIN:
+            return None
+        return next(question for question in self.questions if question.key == key)
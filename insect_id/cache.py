@@ -0,0 +1,54 @@
+"""Bounded LRU cache of per-image inference results."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from .config import INFERENCE_CACHE_SIZE
+
+
+class InferenceCache:
+    """Bounded LRU cache of per-upload inference results, keyed by content hash.
+
+    Streamlit reruns the whole script on every widget interaction, so without
+    this each questionnaire click would decode and predict the upload again.
+    """
+
+    def __init__(self, max_entries=INFERENCE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+            }
@@ -0,0 +1,115 @@
+"""Two-stage model cascade: a small fast classifier first, the full CNN only when it is unsure."""
+
+import threading
+import time
+
+import numpy as np
+
+from .config import CASCADE_AUDIT_RATE, CASCADE_THRESHOLD
+from .metrics import METRICS
+
+FAST_STAGE = "fast"
+FULL_STAGE = "full"
+
+
+class ModelCascade:
+    """Answer confident images with ``fast_fn`` and escalate the rest to ``full_fn``.
+
+    Both callables take a (N, IMG_HEIGHT, IMG_WIDTH, 3) float32 batch and
+    return (N, classes) probabilities. Rows whose fast top probability is at
+    least ``threshold`` keep the fast answer; the others are re-run through
+    the full model in one call. A random ``audit_rate`` share of the accepted
+    rows rides along in that call, so agreement on the answers the fast model
+    keeps is measured rather than assumed.
+
+    ``predict`` returns just the probabilities, so ``iter_batch_inference``
+    and the CLI can classify through the cascade without knowing about stages.
+    """
+
+    def __init__(self, fast_fn, full_fn, threshold=CASCADE_THRESHOLD, audit_rate=CASCADE_AUDIT_RATE,
+                 metrics=METRICS, seed=None):
+        self.fast_fn = fast_fn
+        self.full_fn = full_fn
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.metrics = metrics
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._stage_counts = {FAST_STAGE: 0, FULL_STAGE: 0}
+        self._stage_seconds = {FAST_STAGE: 0.0, FULL_STAGE: 0.0}
+        self._rerun = 0
+        # sample -> [compared, agreed]; "escalated" rows are the uncertain ones, "audited" the accepted ones
+        self._agreement = {"escalated": [0, 0], "audited": [0, 0]}
+
+    def classify(self, images):
+        """Return (probabilities, stages) for a batch; ``stages[i]`` is "fast" or "full"."""
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+
+        start = time.perf_counter()
+        fast = np.asarray(self.fast_fn(images))
+        fast_seconds = time.perf_counter() - start
+        self.metrics.observe("cascade_fast", fast_seconds)
+
+        escalate = fast.max(axis=1) < self.threshold
+        with self._lock:
+            audit = ~escalate & (self._rng.random(len(images)) < self.audit_rate)
+        rerun = escalate | audit
+
+        probabilities = fast.copy()
+        full_seconds = 0.0
+        if rerun.any():
+            start = time.perf_counter()
+            full = np.asarray(self.full_fn(images[rerun]))
+            full_seconds = time.perf_counter() - start
+            self.metrics.observe("cascade_full", full_seconds)
+            agree = fast[rerun].argmax(axis=1) == full.argmax(axis=1)
+            probabilities[escalate] = full[escalate[rerun]]
+            self._record_agreement("escalated", agree[escalate[rerun]])
+            self._record_agreement("audited", agree[audit[rerun]])
+
+        stages = [FULL_STAGE if escalated else FAST_STAGE for escalated in escalate]
+        fast_count = len(stages) - int(escalate.sum())
+        with self._lock:
+            self._requests += len(stages)
+            self._stage_counts[FAST_STAGE] += fast_count
+            self._stage_counts[FULL_STAGE] += len(stages) - fast_count
+            self._stage_seconds[FAST_STAGE] += fast_seconds
+            self._stage_seconds[FULL_STAGE] += full_seconds
+            self._rerun += int(rerun.sum())
+        self.metrics.inc("cascade_images_total", fast_count, stage=FAST_STAGE)
+        self.metrics.inc("cascade_images_total", len(stages) - fast_count, stage=FULL_STAGE)
+        return probabilities, stages
+
+    def predict(self, images, verbose=0):
+        return self.classify(images)[0]
+
+    __call__ = predict
+
+    def _record_agreement(self, sample, agree):
+        if not agree.size:
+            return
+        agreed = int(agree.sum())
+        with self._lock:
+            self._agreement[sample][0] += agree.size
+            self._agreement[sample][1] += agreed
+        self.metrics.inc("cascade_agreement_total", agreed, sample=sample, agree="true")
+        self.metrics.inc("cascade_agreement_total", agree.size - agreed, sample=sample, agree="false")
+
+    def stats(self):
+        """Share of images each stage answered, fast/full agreement and time per image in milliseconds."""
+        with self._lock:
+            requests = self._requests
+            stats = {"requests": requests, "threshold": self.threshold}
+            for stage, count in self._stage_counts.items():
+                stats[f"{stage}_fraction"] = count / requests if requests else 0.0
+            for sample, (compared, agreed) in self._agreement.items():
+                stats[f"{sample}_compared"] = compared
+                stats[f"{sample}_agreement"] = agreed / compared if compared else None
+            # ms_per_image against full_ms_per_image is the average-latency saving
+            stats["ms_per_image"] = sum(self._stage_seconds.values()) / requests * 1000.0 if requests else 0.0
+            stats["fast_ms_per_image"] = self._stage_seconds[FAST_STAGE] / requests * 1000.0 if requests else 0.0
+            stats["full_ms_per_image"] = self._stage_seconds[FULL_STAGE] / self._rerun * 1000.0 if self._rerun else None
+            return stats
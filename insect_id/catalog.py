@@ -0,0 +1,142 @@
+"""Class labels and taxonomy for the species the model can recognise."""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CLASS_NAMES = [
+    'INDIAN BEAN BUG',
+    'COMMON CROW BUTTERFLY',
+    'INDIAN RED BUG',
+    'ORIENTAL BEETLE',
+    'PLAIN TIGER BUTTERFLY',
+    'INDIAN POTTER WASP',
+    'SLENDER MEADOW KATYDID',
+    'SUNDOWNER MOTH',
+    'TROPICAL TIGER MOTH',
+    'WANDERING GLIDER']
+
+TAXONOMY = {
+    'INDIAN BEAN BUG': {
+        'common_name': 'Bean Bug',
+        'species': 'Riptortus pedestris',
+        'genus': 'Riptortus',
+        'family': 'Alydidae',
+        'order': 'Hemiptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'COMMON CROW BUTTERFLY': {
+        'common_name': 'Common Crow Butterfly',
+        'species': 'Euploea core',
+        'genus': 'Euploea',
+        'family': 'Nymphalidae',
+        'order': 'Lepidoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'INDIAN RED BUG': {
+        'common_name': 'Indian Red Bug',
+        'species': 'Dysdercus cingulatus',
+        'genus': 'Dysdercus',
+        'family': 'Pyrrhocoridae',
+        'order': 'Hemiptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'ORIENTAL BEETLE': {
+        'common_name': 'Oriental Beetle',
+        'species': 'Anomala orientalis',
+        'genus': 'Anomala',
+        'family': 'Scarabaeidae',
+        'order': 'Coleoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'PLAIN TIGER BUTTERFLY': {
+        'common_name': 'Plain Tiger Butterfly',
+        'species': 'Danaus chrysippus',
+        'genus': 'Danaus',
+        'family': 'Nymphalidae',
+        'order': 'Lepidoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'INDIAN POTTER WASP': {
+        'common_name': 'Potter Wasp',
+        'species': 'Delta pyriforme',
+        'genus': 'Delta',
+        'family': 'Vespidae',
+        'order': 'Hymenoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'SLENDER MEADOW KATYDID': {
+        'common_name': 'Slender Meadow Katydid',
+        'species': 'Conocephalus fasciatus',
+        'genus': 'Conocephalus',
+        'family': 'Tettigoniidae',
+        'order': 'Orthoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'SUNDOWNER MOTH': {
+        'common_name': 'Sundowner Moth',
+        'species': 'Spingomorpha chlorea',
+        'genus': 'Spingomorpha',
+        'family': 'Erebidae',
+        'order': 'Lepidoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'TROPICAL TIGER MOTH': {
+        'common_name': 'Tropical Tiger Moth',
+        'species': 'Asota caricae',
+        'genus': 'Asota',
+        'family': 'Erebidae',
+        'order': 'Lepidoptera',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    },
+    'WANDERING GLIDER': {
+        'common_name': 'Wandering Glider',
+        'species': 'Pantala flavescens',
+        'genus': 'Pantala',
+        'family': 'Libellulidae',
+        'order': 'Odonata',
+        'class': 'Insecta',
+        'phylum': 'Arthropoda',
+        'kingdom': 'Animalia'
+    }
+}
+
+
+def taxonomy(species):
+    """Return the taxonomic ranks for ``species`` (case-insensitive), or None if unknown."""
+    return TAXONOMY.get(species.upper())
+
+
+def label_for_path(path):
+    """Ground-truth class from a parent folder named after one of CLASS_NAMES, if any."""
+    folder = os.path.basename(os.path.dirname(path)).upper()
+    return folder if folder in CLASS_NAMES else None
+
+
+def check_taxonomy(class_names=CLASS_NAMES, taxonomy=TAXONOMY):
+    """Fail if a model class has no taxonomy entry; warn about entries no class uses."""
+    missing = sorted(set(class_names) - set(taxonomy))
+    if missing:
+        raise ValueError(f"Model classes without a taxonomy entry: {missing}")
+    unused = sorted(set(taxonomy) - set(class_names))
+    if unused:
+        logger.warning("Taxonomy entries not predicted by the model: %s", unused)
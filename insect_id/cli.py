@@ -0,0 +1,264 @@
+"""Command-line interface for classifying image archives without Streamlit.
+
+Example::
+
+    python -m insect_id classify /data/traps --output results.jsonl --batch-size 32 --workers 8
+    python -m insect_id video trap_clip.mp4 --every 0.5
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from .cascade import ModelCascade
+from .catalog import taxonomy
+from .config import (
+    BATCH_SIZE,
+    CASCADE_THRESHOLD,
+    CONFIDENCE_THRESHOLD,
+    DECODE_WORKERS,
+    EMBEDDING_INDEX_PATH,
+    INFERENCE_WORKER_THREADS,
+    MODEL_BACKEND,
+    MODEL_BACKENDS,
+    MODEL_PATH,
+    SIMILAR_SPECIMENS_K,
+    VIDEO_CHANGE_THRESHOLD,
+    VIDEO_SAMPLE_SECONDS,
+)
+from .core import backend_for_path, compare_single_predict, load_model, make_predictor
+from .embeddings import EmbeddingIndex, FeatureExtractor, build_index
+from .hierarchy import TaxonomyRollup
+from .pipeline import iter_batch_inference, iter_image_paths, load_path
+from .video import classify_video
+from .workers import InferenceWorkerPool
+
+
+def to_record(path, result, top_k, rollup):
+    if "error" in result:
+        return {"path": path, "error": result["error"]}
+    predictions = result["predictions"]
+    species = result["initial_pred_class"]
+    return {
+        "path": path,
+        "species": species,
+        "confidence": result["initial_confidence"],
+        "needs_clarification": result["initial_confidence"] < CONFIDENCE_THRESHOLD,
+        "top_k": [{"species": name, "confidence": confidence}
+                  for name, confidence in rollup.top_k(predictions, k=top_k)],
+        "taxonomy": taxonomy(species),
+        # Deepest rank (species, genus, family or order) that reaches the threshold, if any
+        "confident_rank": rollup.deepest_confident(predictions),
+    }
+
+
+def classify(args):
+    if args.inference_workers:
+        model = InferenceWorkerPool(args.inference_workers, args.threads_per_worker,
+                                    model_path=args.model, backend=args.backend, max_batch_size=args.batch_size)
+        model.wait_ready()
+    else:
+        model = make_predictor(load_model(args.model, backend=args.backend))
+    cascade = None
+    if args.cascade_model:
+        fast_model = make_predictor(load_model(args.cascade_model, backend=backend_for_path(args.cascade_model)))
+        cascade = ModelCascade(fast_model, model,
+                               threshold=args.cascade_threshold)
+    rollup = TaxonomyRollup()
+    paths = ((path, path) for path in iter_image_paths(args.directory))
+
+    count = 0
+    start = time.perf_counter()
+    out = open(args.output, "w") if args.output != "-" else sys.stdout
+    try:
+        for batch_results in iter_batch_inference(cascade or model, paths, load=load_path,
+                                                  batch_size=args.batch_size, workers=args.workers):
+            for path, result in batch_results:
+                out.write(json.dumps(to_record(path, result, args.top_k, rollup)) + "\n")
+            out.flush()
+            count += len(batch_results)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if isinstance(model, InferenceWorkerPool):
+            model.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0.0
+    print(f"Classified {count} images in {elapsed:.1f}s ({rate:.1f} images/s)", file=sys.stderr)
+    if cascade is not None:
+        print(f"Cascade: {json.dumps(cascade.stats())}", file=sys.stderr)
+    return 0
+
+
+def video(args):
+    model = make_predictor(load_model(args.model, backend=args.backend))
+    start = time.perf_counter()
+    report = classify_video(model, args.path, sample_every=args.every, change_threshold=args.threshold,
+                            batch_size=args.batch_size, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'start s':>9}{'end s':>9}{'frames':>8}{'conf':>8}  species (order / family)")
+        for segment in report["segments"]:
+            ranks = segment["taxonomy"] or {}
+            confidence = "n/a" if segment["mean_confidence"] is None else f"{segment['mean_confidence']:.1%}"
+            flag = "  [needs clarification]" if segment["needs_clarification"] else ""
+            print(f"{segment['start_s']:>9.1f}{segment['end_s']:>9.1f}{segment['frames']:>8}{confidence:>8}  "
+                  f"{segment['species']} ({ranks.get('order', '?')} / {ranks.get('family', '?')}){flag}")
+    print(f"Classified {report['frames_classified']} of {report['frames_sampled']} sampled frames "
+          f"in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+def build_index_command(args):
+    start = time.perf_counter()
+    index = build_index(load_model(args.model, backend="keras"), args.directory,
+                        limit_per_class=args.limit_per_class, batch_size=args.batch_size, workers=args.workers)
+    index.save(args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(index)} reference images ({index.embeddings.shape[1]}-d) into {args.output} "
+          f"in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+def similar(args):
+    index = EmbeddingIndex.load(args.index)
+    extractor = FeatureExtractor(load_model(args.model, backend="keras"))
+    images = np.stack([load_path(path) for path in args.images])
+    start = time.perf_counter()
+    matches = index.search(extractor(images), k=args.top_k)
+    elapsed = (time.perf_counter() - start) * 1000.0
+    for path, neighbours in zip(args.images, matches):
+        print(json.dumps({"path": path, "similar": neighbours}))
+    print(f"Embedded and searched {len(images)} images against {len(index)} references in {elapsed:.1f} ms",
+          file=sys.stderr)
+    return 0
+
+
+def compare_predict(args):
+    report = compare_single_predict(load_model(args.model, backend=args.backend), runs=args.runs)
+    print(f"{'path':<16}{'first ms':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for path in ("model.predict", "single_image"):
+        row = report[path]
+        print(f"{path:<16}{row['first_ms']:>10.2f}{row['mean_ms']:>10.2f}{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+    print(f"p50 speedup: {report['speedup_p50']:.1f}x, max |diff|: {report['max_abs_diff']:.2e}")
+    return 0
+
+
+def quantize(args):
+    from .quantize import export_tflite
+
+    path = export_tflite(args.model, args.output, mode=args.mode,
+                         calibration_dir=args.calibration_dir, calibration_limit=args.calibration_limit)
+    print(f"Wrote {args.mode} TFLite model to {path}", file=sys.stderr)
+    return 0
+
+
+def compare_backends(args):
+    from .quantize import compare_backends as run_comparison
+
+    report = run_comparison(args.model, args.tflite, args.directory, limit=args.limit)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    def fmt(value, spec):
+        return "n/a" if value is None else format(value, spec)
+
+    print(f"{'backend':<10}{'file MB':>9}{'load MB':>9}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'agree':>8}{'acc':>8}  path")
+    for row in report:
+        print(f"{row['backend']:<10}{row['file_mb']:>9.1f}{fmt(row['load_rss_mb'], '.1f'):>9}"
+              f"{row['latency_ms_mean']:>9.2f}{row['latency_ms_p50']:>9.2f}{row['latency_ms_p99']:>9.2f}"
+              f"{row['agreement_with_keras']:>8.1%}{fmt(row['accuracy'], '.1%'):>8}  {row['path']}")
+    return 0
+
+
+def add_model_arguments(parser):
+    parser.add_argument("-m", "--model", default=None,
+                        help="Model path (default: the standard .keras or .tflite file for --backend).")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=MODEL_BACKEND,
+                        help=f"Inference backend (default: {MODEL_BACKEND}).")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m insect_id", description="Headless insect classification.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("classify", help="Classify every image under a directory and write JSONL results.")
+    p.add_argument("directory", help="Directory to search recursively for .jpg/.jpeg/.png images.")
+    p.add_argument("-o", "--output", default="-", help="JSONL output path (default: stdout).")
+    add_model_arguments(p)
+    p.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE, help=f"Images per forward pass (default: {BATCH_SIZE}).")
+    p.add_argument("-w", "--workers", type=int, default=DECODE_WORKERS, help=f"Decode threads (default: {DECODE_WORKERS}).")
+    p.add_argument("-k", "--top-k", type=int, default=3, help="Number of ranked candidates to record per image (default: 3).")
+    p.add_argument("--inference-workers", type=int, default=0,
+                   help="Run the model in this many worker processes instead of in-process (default: 0).")
+    p.add_argument("--threads-per-worker", type=int, default=INFERENCE_WORKER_THREADS,
+                   help=f"TensorFlow/TFLite threads per inference worker (default: {INFERENCE_WORKER_THREADS}).")
+    p.add_argument("--cascade-model", help="Small .keras or .tflite model to run first; the full model only sees images it is unsure of.")
+    p.add_argument("--cascade-threshold", type=float, default=CASCADE_THRESHOLD,
+                   help=f"Top probability at which the cascade keeps the small model's answer (default: {CASCADE_THRESHOLD}).")
+    p.set_defaults(func=classify)
+
+    p = subparsers.add_parser("video", help="Classify a video or image sequence into a species timeline.")
+    p.add_argument("path", help="Video file, or an image sequence pattern such as trap/img_%%04d.jpg.")
+    add_model_arguments(p)
+    p.add_argument("--every", type=float, default=VIDEO_SAMPLE_SECONDS,
+                   help=f"Seconds between sampled frames (default: {VIDEO_SAMPLE_SECONDS}).")
+    p.add_argument("--threshold", type=float, default=VIDEO_CHANGE_THRESHOLD,
+                   help="Mean grayscale difference (0-255) from the last classified frame below which a frame "
+                        f"is skipped (default: {VIDEO_CHANGE_THRESHOLD}).")
+    p.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE, help=f"Frames per forward pass (default: {BATCH_SIZE}).")
+    p.add_argument("-w", "--workers", type=int, default=DECODE_WORKERS, help=f"Preprocessing threads (default: {DECODE_WORKERS}).")
+    p.add_argument("--json", action="store_true", help="Print the timeline as JSON.")
+    p.set_defaults(func=video)
+
+    p = subparsers.add_parser("build-index", help="Embed reference specimens into a nearest-neighbour index.")
+    p.add_argument("directory", help="Reference images, in folders named after the class they show.")
+    p.add_argument("-o", "--output", default=EMBEDDING_INDEX_PATH, help=f"Index directory (default: {EMBEDDING_INDEX_PATH}).")
+    p.add_argument("-m", "--model", default=MODEL_PATH, help=f"Keras model path (default: {MODEL_PATH}).")
+    p.add_argument("--limit-per-class", type=int, help="Maximum reference images per class.")
+    p.add_argument("-b", "--batch-size", type=int, default=BATCH_SIZE, help=f"Images per forward pass (default: {BATCH_SIZE}).")
+    p.add_argument("-w", "--workers", type=int, default=DECODE_WORKERS, help=f"Decode threads (default: {DECODE_WORKERS}).")
+    p.set_defaults(func=build_index_command)
+
+    p = subparsers.add_parser("similar", help="List the reference specimens most similar to some images.")
+    p.add_argument("images", nargs="+", help="Images to look up.")
+    p.add_argument("-i", "--index", default=EMBEDDING_INDEX_PATH, help=f"Index directory (default: {EMBEDDING_INDEX_PATH}).")
+    p.add_argument("-m", "--model", default=MODEL_PATH, help=f"Keras model path (default: {MODEL_PATH}).")
+    p.add_argument("-k", "--top-k", type=int, default=SIMILAR_SPECIMENS_K,
+                   help=f"Matches per image (default: {SIMILAR_SPECIMENS_K}).")
+    p.set_defaults(func=similar)
+
+    p = subparsers.add_parser("compare-predict", help="Time model.predict against the single-image fast path.")
+    add_model_arguments(p)
+    p.add_argument("-n", "--runs", type=int, default=50, help="Timed calls per path (default: 50).")
+    p.set_defaults(func=compare_predict)
+
+    p = subparsers.add_parser("quantize", help="Export the Keras model to a float16 or int8 TFLite model.")
+    p.add_argument("output", help="Path of the .tflite file to write.")
+    p.add_argument("-m", "--model", default=MODEL_PATH, help=f"Keras model path (default: {MODEL_PATH}).")
+    p.add_argument("--mode", choices=("float16", "int8"), default="float16", help="Quantization mode (default: float16).")
+    p.add_argument("--calibration-dir", help="Folder of representative images; required for int8.")
+    p.add_argument("--calibration-limit", type=int, default=200, help="Maximum calibration images (default: 200).")
+    p.set_defaults(func=quantize)
+
+    p = subparsers.add_parser("compare-backends", help="Compare accuracy, latency and memory of Keras and TFLite models.")
+    p.add_argument("directory", help="Images to evaluate; folders named after a class are used as labels.")
+    p.add_argument("tflite", nargs="+", help="One or more .tflite models to compare against the Keras model.")
+    p.add_argument("-m", "--model", default=MODEL_PATH, help=f"Keras model path (default: {MODEL_PATH}).")
+    p.add_argument("-n", "--limit", type=int, default=500, help="Maximum images to evaluate (default: 500).")
+    p.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    p.set_defaults(func=compare_backends)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,65 @@
+"""Shared settings for the classifier, the Streamlit app and the CLI."""
+
+import os
+
+CONFIDENCE_THRESHOLD = 0.95
+IMG_HEIGHT = 224
+IMG_WIDTH = 224
+
+MODEL_PATH = "INSECT_CNN_FINAL.keras"
+TFLITE_MODEL_PATH = "INSECT_CNN_FINAL.tflite"
+
+# "keras" runs the full-precision model, "tflite" the quantized export
+MODEL_BACKEND = os.environ.get("INSECT_MODEL_BACKEND", "keras")
+MODEL_BACKENDS = ("keras", "tflite")
+
+INFERENCE_CACHE_SIZE = 32
+BATCH_SIZE = 16
+DECODE_WORKERS = 4
+
+SCHEDULER_MAX_BATCH_SIZE = 8
+SCHEDULER_MAX_WAIT_MS = 10
+
+# Adaptive questionnaire: probability that an answer contradicts the true species' rule
+ANSWER_NOISE = 0.05
+
+# Metrics export: Prometheus text over HTTP and/or to a file, both off unless set
+METRICS_PORT = int(os.environ["INSECT_METRICS_PORT"]) if os.environ.get("INSECT_METRICS_PORT") else None
+METRICS_FILE = os.environ.get("INSECT_METRICS_FILE")
+
+# Model cascade: a small fast model (.keras or .tflite) answers first when set,
+# and the full model only runs on images it scores below CASCADE_THRESHOLD
+CASCADE_MODEL_PATH = os.environ.get("INSECT_CASCADE_MODEL")
+CASCADE_THRESHOLD = float(os.environ.get("INSECT_CASCADE_THRESHOLD", CONFIDENCE_THRESHOLD))
+# Share of fast-model answers also run through the full model to measure agreement
+CASCADE_AUDIT_RATE = 0.05
+
+# Persistent prediction store (SQLite); an empty INSECT_PREDICTION_STORE disables it
+PREDICTION_STORE_PATH = os.environ.get("INSECT_PREDICTION_STORE", "insect_predictions.sqlite3")
+PREDICTION_STORE_MAX_MB = 64
+# Largest dHash Hamming distance (of 64 bits) at which a stored photo is a candidate
+# near-duplicate. Trap photos share a fixed background, so different insects on it
+# can hash within a few bits; a candidate must also pass the thumbnail check below.
+DHASH_MAX_DISTANCE = 3
+# Largest difference (0-255) of any cell of two 16x16 colour thumbnails for a
+# candidate to count as the same photo: re-encoded copies stay within a few
+# levels, while a different subject changes the cells it covers by far more
+THUMBNAIL_SIZE = 16
+THUMBNAIL_MAX_DIFFERENCE = 16
+
+# Out-of-process inference: 0 runs the model in the app process, N > 0 starts N
+# worker processes with their own model copy and INFERENCE_WORKER_THREADS each
+INFERENCE_WORKERS = int(os.environ.get("INSECT_INFERENCE_WORKERS", 0))
+INFERENCE_WORKER_THREADS = int(os.environ.get("INSECT_WORKER_THREADS", 0)) or max(
+    1, (os.cpu_count() or 1) // max(INFERENCE_WORKERS, 1)
+)
+
+# Video mode: seconds between sampled frames, and the mean absolute grayscale
+# difference (0-255) from the last classified frame below which a frame is skipped
+VIDEO_SAMPLE_SECONDS = 1.0
+VIDEO_CHANGE_THRESHOLD = 6.0
+
+# Reference-specimen embedding index (built with `python -m insect_id build-index`).
+# The app's similar-specimens panel needs the Keras backend without inference workers
+EMBEDDING_INDEX_PATH = os.environ.get("INSECT_EMBEDDING_INDEX", "reference_index")
+SIMILAR_SPECIMENS_K = 5
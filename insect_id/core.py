@@ -0,0 +1,133 @@
+"""Streamlit-free model loading and prediction."""
+
+import time
+
+import numpy as np
+
+from .catalog import CLASS_NAMES
+from .config import IMG_HEIGHT, IMG_WIDTH, MODEL_BACKEND, MODEL_BACKENDS, MODEL_PATH, TFLITE_MODEL_PATH
+from .tflite import TFLiteModel
+
+
+def load_model(path=None, backend=MODEL_BACKEND, num_threads=None):
+    """Load the classifier from ``path`` with the given backend ("keras" or "tflite").
+
+    ``path`` defaults to MODEL_PATH or TFLITE_MODEL_PATH to match ``backend``.
+    ``num_threads`` caps the TFLite interpreter's threads; Keras models use
+    TensorFlow's process-wide threading settings instead.
+    """
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}, expected one of {MODEL_BACKENDS}")
+    if backend == "tflite":
+        return TFLiteModel(path or TFLITE_MODEL_PATH, num_threads=num_threads)
+
+    from tensorflow.keras.models import load_model as keras_load_model
+
+    return keras_load_model(path or MODEL_PATH)
+
+
+def backend_for_path(path):
+    """The backend that loads ``path``: "tflite" for .tflite files, "keras" otherwise."""
+    return "tflite" if str(path).lower().endswith(".tflite") else "keras"
+
+
+def predict(model, images):
+    """Return the class probability matrix for a batch, or a single image, of preprocessed arrays."""
+    images = np.asarray(images, dtype=np.float32)
+    if images.ndim == 3:
+        images = np.expand_dims(images, axis=0)
+    return model.predict(images, verbose=0)
+
+
+def make_result(img_array, predictions):
+    """Summarise one image's probability vector in the shape the app and CLI share."""
+    pred_index = int(np.argmax(predictions))
+    return {
+        "img_array": img_array,
+        "predictions": predictions,
+        "initial_pred_class": CLASS_NAMES[pred_index],
+        "initial_confidence": float(np.max(predictions)),
+    }
+
+
+class CompiledPredictor:
+    """Compiled forward pass with a (None, IMG_HEIGHT, IMG_WIDTH, 3) float32 input signature.
+
+    ``model.predict`` builds a dataset, iterator and callbacks on every call,
+    which dominates the cost for the small batches a server sees. Calling the
+    model through a ``tf.function`` traces once and then runs the graph
+    directly; the batch dimension is left open, so the same trace serves
+    single images and the scheduler's coalesced batches alike.
+    """
+
+    def __init__(self, model):
+        import tensorflow as tf
+
+        self._tf = tf
+        self._fn = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec((None, IMG_HEIGHT, IMG_WIDTH, 3), tf.float32)],
+        )
+
+    def predict(self, images, verbose=0):
+        images = np.asarray(images, dtype=np.float32).reshape(-1, IMG_HEIGHT, IMG_WIDTH, 3)
+        return self._fn(self._tf.constant(images)).numpy()
+
+    __call__ = predict
+
+    def warm_up(self, runs=1):
+        """Trace the graph and run it ``runs`` times so the first real request pays neither cost."""
+        blank = np.zeros((1, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        for _ in range(runs):
+            self(blank)
+
+
+def make_predictor(model):
+    """Return the fastest callable for batches of any size; TFLite interpreters already are one."""
+    if isinstance(model, TFLiteModel):
+        return model
+    return CompiledPredictor(model)
+
+
+def compare_single_predict(model, runs=50, predictor=None):
+    """Time ``model.predict`` against the compiled path on the same one-image input.
+
+    Returns per-path latency summaries in milliseconds plus the maximum
+    absolute difference between the two outputs.
+    """
+    predictor = predictor or make_predictor(model)
+    rng = np.random.default_rng(0)
+    img_array = rng.random((1, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+
+    # Warm both paths first so tracing is excluded from the steady-state numbers
+    first_keras = _time_call(lambda: predict(model, img_array))
+    first_single = _time_call(lambda: predictor(img_array))
+
+    keras_times = [_time_call(lambda: predict(model, img_array)) for _ in range(runs)]
+    single_times = [_time_call(lambda: predictor(img_array)) for _ in range(runs)]
+    max_abs_diff = float(np.max(np.abs(predict(model, img_array) - predictor(img_array))))
+
+    def summary(first, times):
+        times = np.asarray(times)
+        return {
+            "first_ms": first,
+            "mean_ms": float(times.mean()),
+            "p50_ms": float(np.percentile(times, 50)),
+            "p99_ms": float(np.percentile(times, 99)),
+        }
+
+    keras_summary = summary(first_keras, keras_times)
+    single_summary = summary(first_single, single_times)
+    return {
+        "runs": runs,
+        "model.predict": keras_summary,
+        "single_image": single_summary,
+        "speedup_p50": keras_summary["p50_ms"] / single_summary["p50_ms"],
+        "max_abs_diff": max_abs_diff,
+    }
+
+
+def _time_call(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000.0
@@ -0,0 +1,151 @@
+"""Penultimate-layer embeddings and a cosine nearest-neighbour index of reference specimens."""
+
+import json
+import os
+
+import numpy as np
+
+from .catalog import CLASS_NAMES, label_for_path
+from .config import BATCH_SIZE, DECODE_WORKERS, IMG_HEIGHT, IMG_WIDTH, SIMILAR_SPECIMENS_K
+from .pipeline import iter_batch_inference, iter_image_paths, load_path
+
+EMBEDDINGS_FILE = "embeddings.npy"
+LABELS_FILE = "labels.npy"
+PATHS_FILE = "paths.json"
+
+
+class FeatureExtractor:
+    """Compiled forward pass from the model input to the features its classification layer sees.
+
+    Only Keras models expose their layers; a TFLite export or an inference
+    worker pool can't be used here.
+    """
+
+    def __init__(self, model):
+        if not hasattr(model, "layers"):
+            raise TypeError(f"Feature extraction needs a Keras model, not {type(model).__name__}")
+        import keras
+        import tensorflow as tf
+
+        features = keras.Model(model.inputs, model.layers[-1].input)
+        self._tf = tf
+        self._fn = tf.function(
+            lambda x: features(x, training=False),
+            input_signature=[tf.TensorSpec((None, IMG_HEIGHT, IMG_WIDTH, 3), tf.float32)],
+        )
+        self.dim = int(features.output.shape[-1])
+
+    def predict(self, images, verbose=0):
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        return self._fn(self._tf.constant(images)).numpy()
+
+    __call__ = predict
+
+    def warm_up(self, runs=1):
+        """Trace the graph and run it ``runs`` times so the first similarity search pays neither cost."""
+        blank = np.zeros((1, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+        for _ in range(runs):
+            self(blank)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, np.float32(1e-12))
+
+
+class EmbeddingIndex:
+    """Unit-length float32 reference embeddings with their class labels and image paths.
+
+    Embeddings are normalised when the index is built, so a search is one
+    matrix product plus a partial sort per query. Saved indexes are plain
+    ``.npy`` files; ``load(..., mmap=True)`` maps the embedding matrix
+    instead of reading it, so a large index costs no startup time and its
+    pages are shared between processes.
+    """
+
+    def __init__(self, embeddings, labels, paths):
+        self.embeddings = embeddings
+        self.labels = np.asarray(labels, dtype=np.int16)
+        self.paths = list(paths)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_vectors(cls, vectors, labels, paths):
+        return cls(_normalize(vectors), labels, paths)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, EMBEDDINGS_FILE), np.ascontiguousarray(self.embeddings, dtype=np.float32))
+        np.save(os.path.join(directory, LABELS_FILE), self.labels)
+        with open(os.path.join(directory, PATHS_FILE), "w") as f:
+            json.dump(self.paths, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        labels = np.load(os.path.join(directory, LABELS_FILE))
+        with open(os.path.join(directory, PATHS_FILE)) as f:
+            paths = json.load(f)
+        return cls(embeddings, labels, paths)
+
+    def search(self, queries, k=SIMILAR_SPECIMENS_K):
+        """Top-``k`` references by cosine similarity for each query row.
+
+        Returns one list per query of ``{"species", "path", "similarity"}``
+        dicts, most similar first.
+        """
+        queries = _normalize(queries)
+        if queries.ndim == 1:
+            queries = queries[None]
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in queries]
+        scores = queries @ self.embeddings.T
+        # Partial sort: only the k best columns per row are ordered
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+        results = []
+        for indices, row_scores in zip(top, top_scores):
+            results.append([
+                {"species": CLASS_NAMES[self.labels[i]], "path": self.paths[i], "similarity": float(score)}
+                for i, score in zip(indices, row_scores)
+            ])
+        return results
+
+
+def build_index(model, directory, limit_per_class=None, batch_size=BATCH_SIZE, workers=DECODE_WORKERS):
+    """Embed every image under ``directory`` that sits in a folder named after a class.
+
+    Images outside class folders aren't verified specimens and are skipped,
+    as are unreadable ones. ``limit_per_class`` caps references per species.
+    """
+    extractor = FeatureExtractor(model)
+    counts = dict.fromkeys(CLASS_NAMES, 0)
+    items = []
+    for path in iter_image_paths(directory):
+        label = label_for_path(path)
+        if label is None or (limit_per_class is not None and counts[label] >= limit_per_class):
+            continue
+        counts[label] += 1
+        items.append(((path, CLASS_NAMES.index(label)), path))
+
+    vectors, labels, paths = [], [], []
+    for batch_results in iter_batch_inference(extractor, items, load=load_path, batch_size=batch_size,
+                                              workers=workers, summarize=lambda img_array, row: {"embedding": row}):
+        for (path, label), result in batch_results:
+            if "error" in result:
+                continue
+            vectors.append(result["embedding"])
+            labels.append(label)
+            paths.append(path)
+    if not vectors:
+        raise ValueError(f"No readable images in class-named folders under {directory}")
+    return EmbeddingIndex.from_vectors(np.stack(vectors), labels, paths)
@@ -0,0 +1,90 @@
+"""Roll species probabilities up the taxonomy to answer at the deepest confident rank."""
+
+import numpy as np
+
+from .catalog import CLASS_NAMES, TAXONOMY, check_taxonomy
+from .config import CONFIDENCE_THRESHOLD
+
+# Ranks probabilities are summed over, deepest first; "species" is the model's own classes
+ROLLUP_RANKS = ("genus", "family", "order")
+# Ranks reported above a rolled-up answer, as in the taxonomy entries
+LINEAGE_RANKS = ("genus", "family", "order", "class", "phylum", "kingdom")
+
+
+class TaxonomyRollup:
+    """Class-index-aligned rank groups, compiled once from the taxonomy.
+
+    For each rank every model class maps to a group index, so summing a
+    probability vector per genus, family and order is one gather plus one
+    ``np.add.reduceat`` over all ranks together: O(classes) per image
+    however many classes and groups there are. ``class_names`` and
+    ``taxonomy`` are checked against each other on construction.
+    """
+
+    def __init__(self, class_names=CLASS_NAMES, taxonomy=TAXONOMY, ranks=ROLLUP_RANKS):
+        check_taxonomy(class_names, taxonomy)
+        self.class_names = list(class_names)
+        self.taxonomy = taxonomy
+        self.ranks = tuple(ranks)
+        self.groups = {}
+        self._lineages = {}
+        self._slices = {}
+        columns, starts = [], []
+        group_offset = 0
+        for position, rank in enumerate(self.ranks):
+            names, group_of_class = np.unique([taxonomy[name][rank] for name in self.class_names],
+                                              return_inverse=True)
+            # Columns sorted by group, so each group is one contiguous run for reduceat
+            order = np.argsort(group_of_class, kind="stable")
+            group_starts = np.searchsorted(group_of_class[order], np.arange(len(names)))
+            columns.append(order)
+            starts.append(position * len(self.class_names) + group_starts)
+            self.groups[rank] = names.tolist()
+            self._slices[rank] = slice(group_offset, group_offset + len(names))
+            group_offset += len(names)
+            # Every class in a group shares the ranks from this one up
+            above = LINEAGE_RANKS[LINEAGE_RANKS.index(rank):]
+            self._lineages[rank] = [
+                {level: taxonomy[self.class_names[order[i]]][level] for level in above} for i in group_starts
+            ]
+        self._columns = np.concatenate(columns)
+        self._starts = np.concatenate(starts)
+
+    def roll_up(self, probabilities):
+        """Probability per group of each rank: ``{"genus": array, ...}``, shaped like the input's batch."""
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        totals = np.add.reduceat(probabilities[..., self._columns], self._starts, axis=-1)
+        return {rank: totals[..., self._slices[rank]] for rank in self.ranks}
+
+    def top_k(self, probabilities, rank="species", k=3):
+        """The ``k`` most probable (name, probability) pairs at ``rank`` for one probability vector."""
+        probabilities = np.asarray(probabilities, dtype=np.float32).ravel()
+        if rank == "species":
+            scores, names = probabilities, self.class_names
+        else:
+            scores, names = self.roll_up(probabilities)[rank], self.groups[rank]
+        k = min(k, len(scores))
+        # Partial sort: only the k best entries are ordered
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(names[i], float(scores[i])) for i in top]
+
+    def deepest_confident(self, probabilities, threshold=CONFIDENCE_THRESHOLD):
+        """The deepest rank whose best group reaches ``threshold``, or None.
+
+        Returns ``{"rank", "name", "probability", "lineage"}``; ``lineage``
+        holds that rank and every rank above it from the taxonomy.
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float32).ravel()
+        best = int(np.argmax(probabilities))
+        if probabilities[best] >= threshold:
+            name = self.class_names[best]
+            return {"rank": "species", "name": name, "probability": float(probabilities[best]),
+                    "lineage": self.taxonomy[name]}
+        totals = self.roll_up(probabilities)
+        for rank in self.ranks:
+            best = int(np.argmax(totals[rank]))
+            if totals[rank][best] >= threshold:
+                return {"rank": rank, "name": self.groups[rank][best], "probability": float(totals[rank][best]),
+                        "lineage": self._lineages[rank][best]}
+        return None
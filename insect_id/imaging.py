@@ -0,0 +1,169 @@
+"""Image decoding and preprocessing tuned for large phone photos.
+
+A 12-50 MP JPEG decoded at full resolution costs far more time and memory
+than the 224x224 tensor the model needs. Here the encoded buffer is read
+without copying, JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still
+covers the target size (libjpeg skips the discarded DCT coefficients), and
+resizing, EXIF orientation and colour conversion all happen at the small
+size before a single float32 write into the caller's buffer.
+"""
+
+import struct
+
+import numpy as np
+
+from .config import IMG_HEIGHT, IMG_WIDTH, THUMBNAIL_SIZE
+
+# JPEG start-of-frame markers carry the image size; C4, C8 and CC share the range but are not frames
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+def jpeg_info(buffer):
+    """(width, height, exif_orientation) from a JPEG's headers, or None if ``buffer`` isn't a JPEG.
+
+    Only the marker segments before the first frame header are scanned, so
+    this is cheap regardless of image size. Orientation defaults to 1.
+    """
+    data = memoryview(buffer)
+    if data[:2] != b"\xff\xd8":
+        return None
+    orientation = 1
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:  # fill byte
+            offset += 1
+            continue
+        length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+        segment = data[offset + 4:offset + 2 + length]
+        if marker in _SOF_MARKERS:
+            height, width = struct.unpack(">HH", segment[1:5])
+            return width, height, orientation
+        if marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+            orientation = _exif_orientation(segment[6:]) or orientation
+        if marker == 0xDA:  # start of scan without a frame header
+            return None
+        offset += 2 + length
+    return None
+
+
+def _exif_orientation(tiff):
+    """Orientation tag (1-8) from a TIFF-structured EXIF block, or None."""
+    try:
+        endian = {b"II": "<", b"MM": ">"}[bytes(tiff[:2])]
+        ifd = struct.unpack(endian + "I", tiff[4:8])[0]
+        (count,) = struct.unpack(endian + "H", tiff[ifd:ifd + 2])
+        for i in range(count):
+            entry = ifd + 2 + 12 * i
+            tag, _, _ = struct.unpack(endian + "HHI", tiff[entry:entry + 8])
+            if tag == _EXIF_ORIENTATION_TAG:
+                (value,) = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])
+                return value if 1 <= value <= 8 else None
+    except (KeyError, struct.error):
+        pass
+    return None
+
+
+def reduced_decode_flag(width, height, target_width=IMG_WIDTH, target_height=IMG_HEIGHT):
+    """The most aggressive IMREAD_REDUCED_COLOR_* flag whose output still covers the target size."""
+    import cv2
+
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if width // factor >= target_width and height // factor >= target_height:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def apply_orientation(img, orientation):
+    """Apply an EXIF orientation (1-8) so the image displays upright."""
+    import cv2
+
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def preprocess(buffer, out=None):
+    """Decode encoded image bytes into a normalised (IMG_HEIGHT, IMG_WIDTH, 3) float32 RGB array.
+
+    ``buffer`` may be bytes, a bytearray or a memoryview (e.g. from
+    ``UploadedFile.getbuffer()``); it is wrapped, not copied. When ``out`` is
+    given the result is written into it, such as a row of a batch array.
+    """
+    import cv2
+
+    encoded = np.frombuffer(buffer, dtype=np.uint8)
+    info = jpeg_info(buffer)
+    if info is None:
+        # PNG and anything else: full decode, with OpenCV applying EXIF orientation itself
+        img = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+        orientation = 1
+    else:
+        width, height, orientation = info
+        # A 90-degree orientation swaps the axes, but the target is square so the flag is the same
+        flag = reduced_decode_flag(width, height) | cv2.IMREAD_IGNORE_ORIENTATION
+        img = cv2.imdecode(encoded, flag)
+    if img is None:
+        raise ValueError("Could not decode image")
+
+    # Resizing to a square commutes with rotations and flips, so orient after shrinking
+    img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT))
+    img = apply_orientation(img, orientation)
+    return preprocess_frame(img, out=out)
+
+
+def preprocess_frame(img, out=None):
+    """Turn an already decoded BGR uint8 image (e.g. a video frame) into the model's float32 RGB input."""
+    import cv2
+
+    if img.shape[:2] != (IMG_HEIGHT, IMG_WIDTH):
+        img = cv2.resize(img, (IMG_WIDTH, IMG_HEIGHT), interpolation=cv2.INTER_AREA)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    if out is None:
+        out = np.empty((IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+    np.multiply(img, np.float32(1 / 255.0), out=out, dtype=np.float32)
+    return out
+
+
+def dhash(img_array):
+    """64-bit difference hash of a preprocessed RGB image, as an unsigned int.
+
+    Each bit says whether a pixel of a 9x8 grayscale thumbnail is brighter
+    than its left neighbour, so resized or recompressed copies of a photo
+    hash within a few bits of each other.
+    """
+    import cv2
+
+    img = np.asarray(img_array, dtype=np.float32).reshape(IMG_HEIGHT, IMG_WIDTH, 3)
+    gray = cv2.resize(cv2.cvtColor(img, cv2.COLOR_RGB2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(gray[:, 1:] > gray[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def thumbnail(img_array, size=THUMBNAIL_SIZE):
+    """(size, size, 3) uint8 colour thumbnail of a preprocessed RGB image.
+
+    The dHash only records brightness gradients, so two subjects on the same
+    background can hash alike; comparing thumbnails cell by cell tells them apart.
+    """
+    import cv2
+
+    img = np.asarray(img_array, dtype=np.float32).reshape(IMG_HEIGHT, IMG_WIDTH, 3)
+    small = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    return np.clip(np.rint(small * 255.0), 0, 255).astype(np.uint8)
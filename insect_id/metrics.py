@@ -0,0 +1,169 @@
+"""Per-stage latency histograms and counters, exported as structured logs and Prometheus text.
+
+One process-wide METRICS registry is shared by every session. Stage timings
+go into cumulative histograms (for Prometheus) and a bounded window of
+recent samples (for on-page percentiles); counters track outcomes such as
+low- versus high-confidence identifications.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cache hit (sub-millisecond) to a cold model load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of stage timers, counters and gauges."""
+
+    def __init__(self, namespace="insect_id", buckets=DEFAULT_BUCKETS, window=1024):
+        self.namespace = namespace
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._recent = defaultdict(lambda: deque(maxlen=window))
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block as one observation of ``stage``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            self._recent[stage].append(seconds)
+        logger.info(json.dumps({"event": "stage", "stage": stage, "seconds": round(seconds, 6)}))
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._counters[(name, _label_key(labels))] += amount
+        logger.info(json.dumps({"event": "counter", "name": name, "labels": labels, "amount": amount}))
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def stage_summary(self):
+        """Per stage: total count, mean and recent-window p50/p95 in milliseconds."""
+        with self._lock:
+            summary = {}
+            for stage, histogram in self._histograms.items():
+                recent = np.asarray(self._recent[stage]) * 1000.0
+                summary[stage] = {
+                    "count": histogram["count"],
+                    "mean_ms": histogram["sum"] / histogram["count"] * 1000.0,
+                    "p50_ms": float(np.percentile(recent, 50)),
+                    "p95_ms": float(np.percentile(recent, 95)),
+                }
+            return summary
+
+    def counters(self):
+        with self._lock:
+            return {(name, labels): value for (name, labels), value in self._counters.items()}
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            if self._histograms:
+                lines.append(f"# HELP {ns}_stage_seconds Time spent in each pipeline stage.")
+                lines.append(f"# TYPE {ns}_stage_seconds histogram")
+            for stage, histogram in sorted(self._histograms.items()):
+                for bound, count in zip(self.buckets, histogram["buckets"]):
+                    lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{ns}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+                lines.append(f'{ns}_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+                lines.append(f'{ns}_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+            for kind, series in (("counter", self._counters), ("gauge", self._gauges)):
+                names = sorted({name for name, _ in series})
+                for name in names:
+                    lines.append(f"# TYPE {ns}_{name} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{ns}_{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically write the Prometheus text to ``path`` (e.g. for node_exporter's textfile collector)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+
+METRICS = Metrics()
+
+
+def start_http_server(port, metrics=METRICS, host="0.0.0.0"):
+    """Serve ``metrics`` at http://host:port/metrics from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%d/metrics", host, port)
+    return server
+
+
+def start_file_exporter(path, interval=15.0, metrics=METRICS):
+    """Rewrite ``path`` with the Prometheus text every ``interval`` seconds from a daemon thread."""
+
+    def run():
+        while True:
+            try:
+                metrics.write(path)
+            except OSError:
+                logger.exception("Could not write metrics to %s", path)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="metrics-file", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,80 @@
+"""Batched, pipelined inference over a stream of images."""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .config import BATCH_SIZE, DECODE_WORKERS, IMG_HEIGHT, IMG_WIDTH
+from .core import make_result
+from .imaging import preprocess
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def iter_image_paths(root):
+    """Yield image file paths under ``root`` in a stable, sorted order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def load_path(path, out=None):
+    """``load`` for image file paths: read and preprocess one file."""
+    with open(path, "rb") as f:
+        return preprocess(f.read(), out=out)
+
+
+def iter_batch_inference(model, items, load=preprocess, batch_size=BATCH_SIZE, workers=DECODE_WORKERS,
+                         summarize=make_result):
+    """Classify ``(name, source)`` pairs in fixed-size batches, yielding one list of (name, result) per batch.
+
+    ``load(source, out=row)`` decodes a source straight into its row of one
+    of two preallocated batch arrays. It runs on a thread pool that fills one
+    array while the model predicts on the other, so decoding the next batch
+    overlaps the current forward pass. Sources that fail to load are yielded
+    with ``{"error": message}``; their rows are predicted but ignored. Each
+    other result is ``summarize(img_array, output_row)``.
+    """
+    # Two fixed-shape arrays, so every full batch's forward pass sees the same input shape
+    buffers = np.zeros((2, batch_size, IMG_HEIGHT, IMG_WIDTH, 3), dtype=np.float32)
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def submit(batch):
+            rows = []
+            for row in range(batch_size):
+                item = next(items, None)
+                if item is None:
+                    break
+                out = buffers[batch % 2, row]
+                rows.append((item[0], pool.submit(load, item[1], out=out)))
+            return rows
+
+        batch_index = 0
+        pending = submit(batch_index)
+        upcoming = submit(batch_index + 1)
+        while pending:
+            results = []
+            loaded = []
+            for row, (name, future) in enumerate(pending):
+                try:
+                    future.result()
+                except Exception as e:
+                    results.append((name, {"error": str(e)}))
+                    continue
+                loaded.append((row, name))
+
+            # A short final batch leaves stale rows from earlier batches behind; don't predict them
+            batch = buffers[batch_index % 2, :len(pending)]
+            if loaded:
+                predictions = model.predict(batch, verbose=0)
+                for row, name in loaded:
+                    results.append((name, summarize(batch[row:row + 1].copy(), predictions[row])))
+
+            # This array is free again: start decoding two batches ahead into it
+            batch_index += 1
+            pending, upcoming = upcoming, submit(batch_index + 1)
+            yield results
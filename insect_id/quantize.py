@@ -0,0 +1,128 @@
+"""Post-training quantization of the Keras model to TFLite, and a backend comparison report."""
+
+import os
+import time
+
+import numpy as np
+
+from .catalog import CLASS_NAMES, label_for_path
+from .core import load_model, make_predictor
+from .imaging import preprocess
+from .pipeline import iter_image_paths
+
+QUANTIZATION_MODES = ("float16", "int8")
+
+
+def iter_calibration_images(directory, limit=200):
+    """Yield up to ``limit`` preprocessed (1, H, W, 3) arrays from ``directory``, skipping unreadable files."""
+    count = 0
+    for path in iter_image_paths(directory):
+        if count >= limit:
+            return
+        try:
+            with open(path, "rb") as f:
+                img_array = preprocess(f.read())
+        except ValueError:
+            continue
+        count += 1
+        yield img_array[None]
+
+
+def export_tflite(model_path, output_path, mode="float16", calibration_dir=None, calibration_limit=200):
+    """Convert the Keras model at ``model_path`` into a quantized TFLite file.
+
+    ``float16`` halves the weights and needs no data. ``int8`` quantizes
+    weights and activations and needs ``calibration_dir``, a folder of
+    representative images used to estimate activation ranges. Inputs and
+    outputs stay float32, so the exported model is a drop-in replacement.
+    """
+    import tensorflow as tf
+
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {QUANTIZATION_MODES}")
+    if mode == "int8" and calibration_dir is None:
+        raise ValueError("int8 quantization needs a calibration image directory")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(load_model(model_path, backend="keras"))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        converter.representative_dataset = lambda: ([img] for img in iter_calibration_images(calibration_dir, calibration_limit))
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    tflite_model = converter.convert()
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    return output_path
+
+
+def _rss_bytes():
+    """Current resident set size, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def compare_backends(keras_path, tflite_paths, image_dir, limit=500):
+    """Run the Keras model and each TFLite export over the same images and report the trade-offs.
+
+    For every backend this records model file size, resident memory added by
+    loading it, single-image latency (mean/p50/p99), top-1 agreement with the
+    Keras model and, when images sit in folders named after CLASS_NAMES,
+    top-1 accuracy. Backends are loaded one after another in this process,
+    so the memory figures are deltas rather than isolated footprints.
+    """
+    # Import the framework up front so its own footprint isn't charged to the first backend
+    import tensorflow  # noqa: F401
+
+    paths = list(iter_image_paths(image_dir))[:limit]
+    images, labels = [], []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                images.append(preprocess(f.read())[None])
+        except ValueError:
+            continue
+        labels.append(label_for_path(path))
+    if not images:
+        raise ValueError(f"No readable images under {image_dir}")
+
+    backends = [("keras", keras_path)] + [("tflite", path) for path in tflite_paths]
+    reference = None
+    report = []
+    for backend, path in backends:
+        rss_before = _rss_bytes()
+        model = load_model(path, backend=backend)
+        rss_after = _rss_bytes()
+        # Time the same single-image path the app serves requests with
+        predictor = make_predictor(model)
+        predictor(images[0])
+
+        times, preds = [], []
+        for img_array in images:
+            start = time.perf_counter()
+            probs = predictor(img_array)
+            times.append((time.perf_counter() - start) * 1000.0)
+            preds.append(int(np.argmax(probs)))
+        preds = np.asarray(preds)
+        if reference is None:
+            reference = preds
+
+        labelled = [(p, CLASS_NAMES.index(label)) for p, label in zip(preds, labels) if label is not None]
+        times = np.asarray(times)
+        report.append({
+            "backend": backend,
+            "path": path,
+            "file_mb": os.path.getsize(path) / 2**20,
+            "load_rss_mb": (rss_after - rss_before) / 2**20 if rss_before is not None else None,
+            "latency_ms_mean": float(times.mean()),
+            "latency_ms_p50": float(np.percentile(times, 50)),
+            "latency_ms_p99": float(np.percentile(times, 99)),
+            "agreement_with_keras": float(np.mean(preds == reference)),
+            "accuracy": float(np.mean([p == t for p, t in labelled])) if labelled else None,
+            "images": len(images),
+        })
+    return report
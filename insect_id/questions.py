@@ -0,0 +1,51 @@
+"""Clarification questionnaire shown when the model's confidence is low."""
+
+from collections import namedtuple
+
+NOT_APPLICABLE = "n/a"
+UNANSWERED = "Select..."
+
+# ``depends_on`` names a gating question: this one is only asked when that
+# answer is "yes", and is recorded as NOT_APPLICABLE otherwise.
+Question = namedtuple("Question", ["key", "text", "options", "widget_key", "depends_on"])
+
+QUESTIONS = [
+    Question("wings_visible", "Q1: Does the insect have visible wings?",
+             ["Select...", "yes", "no", "unknown"], "wings_visible_q", None),
+    Question("num_wings", "Q2: How many distinct wings visible?",
+             ["Select...", "2", "4", "more", "unknown"], "num_wings_q", "wings_visible"),
+    Question("transparent_wings", "Q3: Wings transparent or opaque?",
+             ["Select...", "transparent", "opaque", "unknown"], "transparent_wings_q", "wings_visible"),
+    Question("wing_color_pattern", "Q4: Wing color pattern",
+             ["black with white spots", "orange with black border and white spots", "clear", "golden tint", "other/unknown"],
+             "wing_color_pattern_q", "wings_visible"),
+    Question("resting_position", "Q5: Wing resting position",
+             ["Select...", "flat over body", "tent-like", "vertically upright", "outstretched", "other/unknown"],
+             "resting_position_q", "wings_visible"),
+    Question("body_color", "Q6: Body color",
+             ["Select...", "red", "brown", "black", "green", "yellow", "orange", "other/unknown"], "body_color_q", None),
+    Question("body_texture_appearance", "Q7: Body texture",
+             ["Select...", "hard and shiny", "soft", "hairy/furry",
+              "elongated with narrow middle part", "elongated and slender", "other/unknown"], "body_texture_q", None),
+    Question("num_legs", "Q8: Number of legs",
+             ["Select...", "6", "8", "more", "n/a", "unknown"], "num_legs_q", None),
+    Question("antennae_present", "Q9: Antennae visible?",
+             ["Select...", "yes", "no", "unknown"], "antennae_present_q", None),
+    Question("antennae_shape", "Q10: Antennae shape",
+             ["Select...", "clubbed", "thread-like", "bent", "very long", "small", "3 spikes", "other", "unknown"],
+             "antennae_shape_q", "antennae_present"),
+    Question("antennae_color", "Q11: Antennae color",
+             ["Select...", "black", "brown", "orange", "other/unknown"], "antennae_color_q", "antennae_present"),
+    Question("eye_color", "Q12: Eye color",
+             ["Select...", "dark", "red", "yellow", "brown", "green", "other", "n/a", "unknown"], "eye_color_q", None),
+]
+
+QUESTIONS_BY_KEY = {question.key: question for question in QUESTIONS}
+
+
+def answer_values(question):
+    """Every value an answer to ``question`` can take, including NOT_APPLICABLE for gated questions."""
+    values = list(question.options)
+    if question.depends_on is not None and NOT_APPLICABLE not in values:
+        values.append(NOT_APPLICABLE)
+    return values
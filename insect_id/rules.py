@@ -0,0 +1,348 @@
+"""Rule-based species identification from questionnaire answers.
+
+Each species' rule is declared as data: a constraint per question, or per
+tuple of questions where a rule couples them. The rules are compiled once
+into a species-by-answer constraint matrix, which scores answers against
+every species for ranking, and into one species bitmask per answer, so
+identifying an answers dict is a handful of integer ANDs.
+"""
+
+import itertools
+import operator
+import threading
+
+import numpy as np
+
+from .questions import NOT_APPLICABLE, QUESTIONS, UNANSWERED, answer_values
+
+UNCERTAIN_SPECIES = "UNCERTAIN_SPECIES"
+
+
+def contains_any(user_answer, keywords):
+    if not isinstance(user_answer, str):
+        user_answer = str(user_answer)
+    return any(keyword.lower() in user_answer.lower() for keyword in keywords)
+
+
+def one_of(*values):
+    return lambda answer: answer in values
+
+
+def contains(*keywords):
+    return lambda answer: contains_any(answer, keywords)
+
+
+def either(*predicates):
+    return lambda answer: any(predicate(answer) for predicate in predicates)
+
+
+# Rules in priority order: when several species match every constraint, the
+# first one listed wins. Questions a rule doesn't mention are unconstrained.
+RULES = [
+    ("WANDERING GLIDER", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("4", "more", "unknown"),
+        ("transparent_wings", "wing_color_pattern"):
+            lambda transparent, pattern: transparent == "transparent" or contains_any(pattern, ["clear", "golden tint"]),
+        "resting_position": one_of("outstretched"),
+        "body_color": either(contains("brown", "reddish-brown", "yellow", "orange", "other"), one_of("unknown")),
+        "body_texture_appearance": one_of("elongated and slender", "other", "unknown"),
+        "num_legs": one_of("6", "unknown"),
+        ("antennae_present", "antennae_shape"):
+            lambda present, shape: present in ("no", "unknown") or (present == "yes" and shape == "small"),
+        "eye_color": either(contains("dark", "red", "brown", "yellow", "green", "other"), one_of("unknown")),
+    }),
+    ("COMMON CROW BUTTERFLY", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("4", "2", "unknown"),
+        "transparent_wings": one_of("opaque"),
+        "wing_color_pattern": contains("black with white spots", "black", "white spots"),
+        "resting_position": one_of("vertically upright"),
+        "body_color": contains("black", "dark"),
+        "body_texture_appearance": one_of("soft", "hairy/furry", "unknown"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("clubbed", "unknown"),
+        "antennae_color": one_of("black"),
+    }),
+    ("PLAIN TIGER BUTTERFLY", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("4", "2", "unknown"),
+        "transparent_wings": one_of("opaque"),
+        "wing_color_pattern": contains("orange with black border and white spots", "orange", "black border", "white spots"),
+        "resting_position": one_of("vertically upright"),
+        "body_color": contains("orange", "brownish-orange"),
+        "body_texture_appearance": one_of("soft", "hairy/furry", "unknown"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("clubbed", "other", "thread-like"),
+        "antennae_color": one_of("black"),
+    }),
+    ("SUNDOWNER MOTH", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("2", "4", "unknown"),
+        "transparent_wings": one_of("opaque"),
+        "wing_color_pattern": contains("brownish with dark patches", "brown", "grey", "dark patches", "subtle", "uniform", "other", "unknown"),
+        "resting_position": one_of("flat over body", "tent-like", "unknown"),
+        "body_color": either(contains("brown", "grey", "black"), one_of("unknown")),
+        "body_texture_appearance": one_of("hairy/furry"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("thread-like", "other", "unknown"),
+        "antennae_color": either(contains("brown", "black"), one_of("unknown")),
+    }),
+    ("TROPICAL TIGER MOTH", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("2", "4", "unknown"),
+        "transparent_wings": one_of("opaque"),
+        "wing_color_pattern": contains("orange and yellow", "striped", "spots", "yellow", "orange", "black"),
+        "resting_position": one_of("tent-like", "flat over body", "unknown"),
+        "body_color": contains("yellow", "orange"),  # Adjusted to match provided images better
+        "body_texture_appearance": one_of("hairy/furry"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("thread-like", "other", "unknown"),
+        "antennae_color": either(contains("black", "brown"), one_of("unknown")),
+    }),
+    ("ORIENTAL BEETLE", {
+        "wings_visible": one_of("yes", "no"),  # Wings may not be prominent
+        "num_wings": one_of("2", "unknown", "n/a"),  # Hardened forewings cover hindwings, appearing as 2
+        "transparent_wings": one_of("opaque", "transparent"),  # Elytra opaque, hindwings transparent
+        "wing_color_pattern": contains("brown", "metallic", "darker brown", "other", "unknown"),
+        "resting_position": one_of("flat over body"),
+        "body_color": contains("brown", "green", "black", "metallic", "other", "unknown"),
+        "body_texture_appearance": one_of("hard and shiny"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": either(contains("clubbed", "lamellate", "other"), one_of("unknown")),
+        "antennae_color": either(contains("brown", "black"), one_of("unknown")),
+    }),
+    ("INDIAN RED BUG", {
+        "wings_visible": one_of("yes", "no"),  # Some are apterous, others winged
+        "num_wings": one_of("2", "unknown", "n/a"),
+        "transparent_wings": one_of("opaque"),
+        "wing_color_pattern": contains("red with black spots", "red", "black spots", "uniform"),
+        "resting_position": one_of("flat over body"),
+        "body_color": contains("red", "orange"),
+        "body_texture_appearance": one_of("soft"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("thread-like"),
+        "antennae_color": one_of("black"),
+    }),
+    ("INDIAN BEAN BUG", {
+        "wings_visible": one_of("yes", "no"),  # Usually winged, but not always visible
+        "num_wings": one_of("2", "unknown", "n/a"),
+        "transparent_wings": one_of("opaque"),
+        "wing_color_pattern": contains("brown", "uniform", "subtle", "other", "unknown"),
+        "resting_position": one_of("flat over body"),
+        "body_color": contains("brown", "dark brown", "other", "unknown"),
+        "body_texture_appearance": one_of("elongated and slender"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("thread-like"),
+        "antennae_color": one_of("brown"),
+    }),
+    ("INDIAN POTTER WASP", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("2", "4", "unknown"),  # Appears as 2, technically 4
+        "transparent_wings": one_of("transparent"),
+        "wing_color_pattern": either(contains("clear", "smoky"), one_of("unknown")),
+        "resting_position": one_of("flat over body", "other", "unknown"),
+        "body_color": contains("black", "yellow", "orange", "other"),
+        "body_texture_appearance": one_of("elongated with narrow middle part"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": either(contains("bent", "elbowed", "other", "3 spikes"), one_of("unknown")),  # Added 3 spikes for robustness
+        "antennae_color": either(contains("yellow", "black"), one_of("unknown")),
+    }),
+    ("SLENDER MEADOW KATYDID", {
+        "wings_visible": one_of("yes"),
+        "num_wings": one_of("2", "unknown"),
+        "transparent_wings": one_of("opaque", "transparent"),
+        "wing_color_pattern": either(contains("green", "brown", "greenish"), one_of("unknown")),
+        "resting_position": one_of("flat over body"),  # Often held flat or tent-like
+        "body_color": either(contains("green", "brown", "other"), one_of("unknown")),
+        "body_texture_appearance": one_of("soft", "elongated and slender", "other", "unknown"),
+        "num_legs": one_of("6", "unknown"),
+        "antennae_present": one_of("yes"),
+        "antennae_shape": one_of("very long", "thread-like", "other", "unknown"),
+        "antennae_color": either(contains("black", "brown"), one_of("unknown")),
+    }),
+]
+
+
+class RuleEngine:
+    """Rules compiled into a species-by-answer-column constraint matrix.
+
+    Every question, and every tuple of questions some rule couples, is a
+    slot. Each possible value of a slot gets one column, set to 1 for the
+    species whose constraint on that slot the value satisfies (or that don't
+    constrain the slot at all). The matrix is stored transposed, one row per
+    column, so gathering an answer's columns is plain fancy indexing.
+
+    An answers dict is encoded as one column index per slot, i.e. a sparse
+    one-hot vector, and its score for every species is the sum of the
+    gathered columns: the number of slots matched.
+    Answer values outside the questionnaire's options get their column
+    compiled on first sight. Each column is also kept as an integer bitmask
+    over species, so identification is a handful of ANDs per answers dict
+    with no array building at all. Encoding is what costs in bulk: looking
+    up every slot's column takes longer than ``identify`` does, so only
+    scoring (``score_many``, ``match_fractions``, ``rank``) encodes answers.
+    """
+
+    def __init__(self, rules=RULES, questions=QUESTIONS):
+        self.species = [name for name, _ in rules]
+        vocabularies = {question.key: answer_values(question) for question in questions}
+
+        # Single-question slots are keyed by the answer itself, coupled ones by a tuple of answers
+        self.slots = [question.key for question in questions]
+        for _, constraints in rules:
+            for slot in constraints:
+                if isinstance(slot, tuple) and slot not in self.slots:
+                    self.slots.append(slot)
+
+        # Per species, per slot: the predicate over that slot's values, or None
+        self._predicates = [
+            [self._slot_predicate(constraints, slot) for slot in self.slots]
+            for _, constraints in rules
+        ]
+        constrained = np.array([[p is not None for p in row] for row in self._predicates])
+        self._constrained_counts = constrained.sum(axis=1)
+        self._free_counts = len(self.slots) - self._constrained_counts
+
+        self._lock = threading.Lock()
+        self._columns = [{} for _ in self.slots]
+        self._matrix = np.zeros((0, len(self.species)), dtype=np.uint8)
+        self._masks = []
+        self._all_species = (1 << len(self.species)) - 1
+        for slot_index, slot in enumerate(self.slots):
+            if isinstance(slot, tuple):
+                values = itertools.product(*(vocabularies[key] for key in slot))
+            else:
+                values = vocabularies[slot]
+            for value in values:
+                self._add_column(slot_index, value)
+
+    @staticmethod
+    def _slot_predicate(constraints, slot):
+        predicate = constraints.get(slot)
+        if predicate is not None and isinstance(slot, tuple):
+            return lambda value: predicate(*value)
+        return predicate
+
+    def _add_column(self, slot_index, value):
+        column = np.array([
+            1 if row[slot_index] is None or row[slot_index](value) else 0
+            for row in self._predicates
+        ], dtype=np.uint8)
+        # Rebind rather than resize, and publish the column index only once
+        # the row exists, so concurrent readers never see a partial update
+        self._matrix = np.vstack([self._matrix, column])
+        self._masks.append(sum(1 << j for j, satisfied in enumerate(column) if satisfied))
+        self._columns[slot_index][value] = len(self._matrix) - 1
+        return len(self._matrix) - 1
+
+    def _column(self, slot_index, value):
+        column = self._columns[slot_index].get(value)
+        if column is None:
+            with self._lock:
+                column = self._columns[slot_index].get(value)
+                if column is None:
+                    column = self._add_column(slot_index, value)
+        return column
+
+    def slot_constraints(self, slot):
+        """(values, indicator) for a slot: its known answer values and a (n_values, n_species) 0/1 matrix."""
+        slot_index = self.slots.index(slot)
+        values = list(self._columns[slot_index])
+        return values, self._matrix[[self._columns[slot_index][value] for value in values]]
+
+    def encode_many(self, answers_list):
+        """Encode answers dicts as an (n_answers, n_slots) matrix of column indices."""
+        encoded = np.empty((len(self.slots), len(answers_list)), dtype=np.intp)
+        for slot_index, slot in enumerate(self.slots):
+            keys = slot if isinstance(slot, tuple) else (slot,)
+            try:
+                values = list(map(operator.itemgetter(*keys), answers_list))
+            except KeyError:
+                # Questions missing from a stored answers dict count as not applicable
+                values = [operator.itemgetter(*keys)(dict.fromkeys(keys, NOT_APPLICABLE) | ans) for ans in answers_list]
+            try:
+                encoded[slot_index] = np.fromiter(map(self._columns[slot_index].__getitem__, values),
+                                                  dtype=np.intp, count=len(values))
+            except KeyError:
+                for value in set(values).difference(self._columns[slot_index]):
+                    self._column(slot_index, value)
+                encoded[slot_index] = [self._columns[slot_index][value] for value in values]
+        return encoded.T
+
+    def score_many(self, answers_list):
+        """Matched-slot counts, shape (n_answers, n_species), gathered and summed slot by slot."""
+        encoded = self.encode_many(answers_list)
+        matrix = self._matrix
+        scores = np.zeros((len(encoded), len(self.species)), dtype=np.int32)
+        for slot_index in range(len(self.slots)):
+            scores += matrix[encoded[:, slot_index]]
+        return scores
+
+    def match_fractions(self, answers_list):
+        """Fraction of each species' own constraints satisfied, shape (n_answers, n_species)."""
+        satisfied = self.score_many(answers_list) - self._free_counts
+        return satisfied / self._constrained_counts
+
+    def identify_many(self, answers_list):
+        """``identify`` for each answers dict; the bitmask path beats encoding them for the matrix."""
+        identify = self.identify
+        return [identify(ans) for ans in answers_list]
+
+    def identify(self, ans):
+        """First species, in rule order, matching every constraint, or UNCERTAIN_SPECIES."""
+        matches = self._all_species
+        masks = self._masks
+        for slot_index, (slot, columns) in enumerate(zip(self.slots, self._columns)):
+            if slot.__class__ is tuple:
+                value = tuple([ans.get(key, NOT_APPLICABLE) for key in slot])
+            else:
+                value = ans.get(slot, NOT_APPLICABLE)
+            column = columns.get(value)
+            matches &= masks[self._column(slot_index, value) if column is None else column]
+            if not matches:
+                return UNCERTAIN_SPECIES
+        # Lowest set bit: the first matching species in rule order
+        return self.species[(matches & -matches).bit_length() - 1]
+
+    def consistent(self, ans):
+        """Bitmask (bit j for ``species[j]``) of species whose constraints every answered slot satisfies.
+
+        Unlike ``identify``, questions missing from ``ans`` or left unanswered
+        rule nothing out, so this works on a questionnaire still in progress.
+        """
+        matches = self._all_species
+        for slot_index, slot in enumerate(self.slots):
+            keys = slot if slot.__class__ is tuple else (slot,)
+            value = tuple([ans.get(key, UNANSWERED) for key in keys])
+            if UNANSWERED in value:
+                continue
+            matches &= self._masks[self._column(slot_index, value if slot.__class__ is tuple else value[0])]
+        return matches
+
+    def rank(self, ans):
+        """All species as (species, match fraction) pairs, best first; ties keep rule order."""
+        fractions = self.match_fractions([ans])[0]
+        order = np.argsort(-fractions, kind="stable")
+        return [(self.species[j], float(fractions[j])) for j in order]
+
+
+ENGINE = RuleEngine()
+
+
+def identify(ans):
+    """Identify a species from questionnaire answers, or return UNCERTAIN_SPECIES."""
+    return ENGINE.identify(ans)
+
+
+def rank(ans):
+    """Rank every species by how many of its constraints ``ans`` satisfies."""
+    return ENGINE.rank(ans)
@@ -0,0 +1,128 @@
+"""Micro-batching scheduler that coalesces concurrent single-image predictions."""
+
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from .config import SCHEDULER_MAX_BATCH_SIZE, SCHEDULER_MAX_WAIT_MS
+
+
+class MicroBatchScheduler:
+    """Collect prediction requests from many threads into batched calls of ``predict_fn``.
+
+    A background thread takes the first queued request, then keeps collecting
+    until ``max_batch_size`` requests are waiting or ``max_wait_ms`` has passed
+    since that first request, runs one forward pass and hands each caller its
+    own row of the output.
+
+    With ``concurrency`` above 1 (e.g. one per inference worker process), up
+    to that many batches run at once; collection of the next batch waits for
+    a free slot, so requests keep accumulating while every slot is busy.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=SCHEDULER_MAX_BATCH_SIZE,
+                 max_wait_ms=SCHEDULER_MAX_WAIT_MS, wait_samples=1024, concurrency=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.concurrency = concurrency
+        self._slots = threading.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix="micro-batch") if concurrency > 1 else None
+        self._queue = queue.Queue()
+        self._batch_sizes = Counter()
+        self._waits = deque(maxlen=wait_samples)
+        self._requests = 0
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batch-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, img_array):
+        """Queue one preprocessed image and return a Future for its probability vector."""
+        if self._closed.is_set():
+            raise RuntimeError("Scheduler is closed")
+        img_array = np.asarray(img_array, dtype=np.float32)
+        if img_array.ndim == 4:
+            img_array = img_array[0]
+        future = Future()
+        self._queue.put((img_array, future, time.perf_counter()))
+        return future
+
+    def predict(self, img_array, timeout=None):
+        return self.submit(img_array).result(timeout)
+
+    def predict_many(self, images, timeout=None):
+        """Queue every image of a batch and return their probability vectors stacked in order."""
+        futures = [self.submit(img_array) for img_array in images]
+        return np.stack([future.result(timeout) for future in futures])
+
+    def close(self):
+        self._closed.set()
+        self._queue.put(None)
+        self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        requests = [first]
+        deadline = first[2] + self.max_wait
+        while len(requests) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            requests.append(request)
+        return requests
+
+    def _run(self):
+        while True:
+            self._slots.acquire()
+            requests = self._collect()
+            if requests is None:
+                return
+            started = time.perf_counter()
+            with self._lock:
+                self._requests += len(requests)
+                self._batch_sizes[len(requests)] += 1
+                self._waits.extend(started - submitted for _, _, submitted in requests)
+            if self._executor is None:
+                self._dispatch(requests)
+            else:
+                self._executor.submit(self._dispatch, requests)
+
+    def _dispatch(self, requests):
+        try:
+            predictions = self.predict_fn(np.stack([img for img, _, _ in requests]))
+        except Exception as e:
+            for _, future, _ in requests:
+                future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        for i, (_, future, _) in enumerate(requests):
+            future.set_result(predictions[i])
+
+    def stats(self):
+        with self._lock:
+            waits_ms = np.asarray(self._waits) * 1000.0
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": batches,
+                "mean_batch_size": self._requests / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "wait_ms_p50": float(np.percentile(waits_ms, 50)) if waits_ms.size else 0.0,
+                "wait_ms_p99": float(np.percentile(waits_ms, 99)) if waits_ms.size else 0.0,
+            }
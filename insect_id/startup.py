@@ -0,0 +1,64 @@
+"""Background model loading with a per-phase startup timing breakdown."""
+
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Record how long each named startup phase took, in the order they ran."""
+
+    def __init__(self):
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = elapsed
+            logger.info("Startup phase %s took %.3fs", name, elapsed)
+
+    def breakdown(self):
+        """Phase durations in milliseconds, plus their total."""
+        with self._lock:
+            phases = {name: seconds * 1000.0 for name, seconds in self.phases.items()}
+        phases["total"] = sum(phases.values())
+        return phases
+
+
+class BackgroundLoader:
+    """Run ``load(timer)`` on a daemon thread so the UI can render while it works.
+
+    ``load`` receives a StartupTimer to wrap its phases in; its return value
+    (or exception) is available from ``result()``.
+    """
+
+    def __init__(self, load, name="model-loader"):
+        self.timer = StartupTimer()
+        self._future = Future()
+        self._thread = threading.Thread(target=self._run, args=(load,), name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self, load):
+        try:
+            self._future.set_result(load(self.timer))
+        except Exception as e:
+            logger.exception("Background load failed")
+            self._future.set_exception(e)
+        else:
+            logger.info("Startup timings (ms): %s", self.timer.breakdown())
+
+    def ready(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
@@ -0,0 +1,235 @@
+"""SQLite-backed prediction store that survives restarts and recognises near-duplicate photos."""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from .config import DHASH_MAX_DISTANCE, PREDICTION_STORE_MAX_MB, PREDICTION_STORE_PATH, THUMBNAIL_MAX_DIFFERENCE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    key TEXT NOT NULL,
+    model TEXT NOT NULL,
+    dhash INTEGER NOT NULL,
+    predictions BLOB NOT NULL,
+    thumbnail BLOB,
+    answers TEXT,
+    final_species TEXT,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (key, model)
+);
+CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used);
+"""
+
+# Share of entries dropped per eviction round, so a full store isn't trimmed on every put
+EVICT_FRACTION = 0.1
+
+
+def model_fingerprint(*paths):
+    """Identify the model file(s) behind stored predictions by name, size and modification time."""
+    parts = []
+    for path in paths:
+        if not path:
+            continue
+        try:
+            stat = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}")
+        except OSError:
+            parts.append(os.path.basename(path))
+    return "|".join(parts)
+
+
+def _signed(value):
+    # SQLite integers are signed 64-bit
+    return int(np.uint64(value).view(np.int64))
+
+
+class PredictionStore:
+    """Persist prediction vectors, questionnaire answers and final species per upload.
+
+    Entries are keyed by the upload's SHA-256 (``InferenceCache.key_for``) and
+    carry its 64-bit dHash and colour thumbnail. ``get`` finds byte-identical
+    uploads and ``nearest`` resized or recompressed copies: candidates within
+    ``max_distance`` bits, confirmed by no thumbnail cell differing by more
+    than ``max_difference``. Every hash is mirrored in a NumPy array so the
+    candidate scan is one vectorised XOR and popcount rather than a query.
+    Least recently used entries are
+    evicted once the live database pages exceed ``max_bytes``. Entries are
+    scoped to ``model``, so a retrained model never serves stale predictions.
+    """
+
+    def __init__(self, path=PREDICTION_STORE_PATH, model="", max_bytes=PREDICTION_STORE_MAX_MB * 1024 * 1024,
+                 max_distance=DHASH_MAX_DISTANCE, max_difference=THUMBNAIL_MAX_DIFFERENCE):
+        self.path = path
+        self.model = model
+        self.max_bytes = max_bytes
+        self.max_distance = max_distance
+        self.max_difference = max_difference
+        self.hits = {"exact": 0, "near": 0}
+        self.misses = {"exact": 0, "near": 0}
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        # Stores written before thumbnails existed: their rows stay exact-match only
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(predictions)")}
+        if "thumbnail" not in columns:
+            with self._conn:
+                self._conn.execute("ALTER TABLE predictions ADD COLUMN thumbnail BLOB")
+        self._load_index()
+
+    def _load_index(self):
+        rows = self._conn.execute("SELECT key, dhash FROM predictions WHERE model = ?", (self.model,)).fetchall()
+        self._keys = [key for key, _ in rows]
+        self._positions = {key: i for i, key in enumerate(self._keys)}
+        self._hashes = np.zeros(max(len(rows) * 2, 1024), dtype=np.uint64)
+        self._hashes[:len(rows)] = np.array([value for _, value in rows], dtype=np.int64).view(np.uint64)
+
+    def _index(self, key, dhash):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._positions[key] = len(self._keys)
+            self._keys.append(key)
+            if position == len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[position] = dhash
+
+    def _fetch(self, key):
+        row = self._conn.execute(
+            "SELECT predictions, answers, final_species FROM predictions WHERE key = ? AND model = ?",
+            (key, self.model),
+        ).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE predictions SET last_used = ? WHERE key = ? AND model = ?",
+                               (time.time(), key, self.model))
+        predictions, answers, final_species = row
+        return {
+            "key": key,
+            "predictions": np.frombuffer(predictions, dtype=np.float32).copy(),
+            "answers": json.loads(answers) if answers else None,
+            "final_species": final_species,
+        }
+
+    def get(self, key):
+        """The entry stored for exactly this upload, or None."""
+        with self._lock:
+            entry = self._fetch(key)
+            if entry is None:
+                self.misses["exact"] += 1
+            else:
+                self.hits["exact"] += 1
+                entry["distance"] = 0
+            return entry
+
+    def _same_photo(self, key, thumbnail):
+        row = self._conn.execute("SELECT thumbnail FROM predictions WHERE key = ? AND model = ?",
+                                 (key, self.model)).fetchone()
+        if row is None or row[0] is None:
+            return False
+        stored = np.frombuffer(row[0], dtype=np.uint8).astype(np.int16)
+        current = np.asarray(thumbnail, dtype=np.uint8).ravel().astype(np.int16)
+        return stored.shape == current.shape and int(np.abs(stored - current).max()) <= self.max_difference
+
+    def nearest(self, dhash, thumbnail):
+        """The closest entry within ``max_distance`` bits of ``dhash`` whose thumbnail matches, else None."""
+        with self._lock:
+            count = len(self._keys)
+            if count:
+                xor = self._hashes[:count] ^ np.uint64(dhash)
+                distances = np.unpackbits(xor.view(np.uint8).reshape(count, 8), axis=1).sum(axis=1)
+                candidates = np.flatnonzero(distances <= self.max_distance)
+                for position in candidates[np.argsort(distances[candidates], kind="stable")]:
+                    key = self._keys[position]
+                    if not self._same_photo(key, thumbnail):
+                        continue
+                    entry = self._fetch(key)
+                    if entry is not None:
+                        self.hits["near"] += 1
+                        entry["distance"] = int(distances[position])
+                        return entry
+            self.misses["near"] += 1
+            return None
+
+    def put(self, key, dhash, predictions, answers=None, final_species=None, thumbnail=None):
+        """Store one upload's probability vector, keeping any answers already recorded for it."""
+        blob = np.asarray(predictions, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    """
+                    INSERT INTO predictions
+                        (key, model, dhash, predictions, thumbnail, answers, final_species, created, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (key, model) DO UPDATE SET
+                        dhash = excluded.dhash,
+                        predictions = excluded.predictions,
+                        thumbnail = COALESCE(excluded.thumbnail, thumbnail),
+                        answers = COALESCE(excluded.answers, answers),
+                        final_species = COALESCE(excluded.final_species, final_species),
+                        last_used = excluded.last_used
+                    """,
+                    (key, self.model, _signed(dhash), blob,
+                     None if thumbnail is None else np.asarray(thumbnail, dtype=np.uint8).tobytes(),
+                     json.dumps(answers) if answers else None,
+                     final_species, now, now),
+                )
+            self._index(key, dhash)
+            self._evict()
+
+    def record_identification(self, key, answers, final_species):
+        """Attach questionnaire answers and the final species to a stored upload."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE predictions SET answers = ?, final_species = ?, last_used = ? WHERE key = ? AND model = ?",
+                (json.dumps(answers), final_species, time.time(), key, self.model),
+            )
+
+    def size_bytes(self):
+        """Bytes of database pages in use; freed pages are reused, so this is what eviction bounds."""
+        page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - free_pages) * page_size
+
+    def _evict(self):
+        evicted = 0
+        while self.size_bytes() > self.max_bytes:
+            total = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            if not total:
+                break
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM predictions WHERE rowid IN "
+                    "(SELECT rowid FROM predictions ORDER BY last_used LIMIT ?)",
+                    (max(int(total * EVICT_FRACTION), 1),),
+                )
+            evicted += cursor.rowcount
+        if evicted:
+            self.evicted += evicted
+            self._load_index()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._keys),
+                "exact_hits": self.hits["exact"],
+                "exact_misses": self.misses["exact"],
+                "near_hits": self.hits["near"],
+                "near_misses": self.misses["near"],
+                "evicted": self.evicted,
+                "size_mb": self.size_bytes() / (1024 * 1024),
+                "max_mb": self.max_bytes / (1024 * 1024),
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,57 @@
+"""TensorFlow Lite interpreter wrapped to look like a Keras model to the rest of the package."""
+
+import threading
+
+import numpy as np
+
+
+class TFLiteModel:
+    """Run a ``.tflite`` export through ``predict``/``__call__`` like the Keras model.
+
+    The interpreter is not thread-safe, so calls are serialised with a lock;
+    the input tensor is resized only when the batch size changes.
+    """
+
+    def __init__(self, path, num_threads=None):
+        import tensorflow as tf
+
+        self.path = path
+        self._interpreter = tf.lite.Interpreter(model_path=path, num_threads=num_threads)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def predict(self, images, verbose=0):
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        with self._lock:
+            if images.shape[0] != self._batch_size:
+                self._interpreter.resize_tensor_input(self._input["index"], images.shape)
+                self._interpreter.allocate_tensors()
+                self._batch_size = images.shape[0]
+            self._interpreter.set_tensor(self._input["index"], self._quantize_input(images))
+            self._interpreter.invoke()
+            return self._dequantize_output(self._interpreter.get_tensor(self._output["index"]))
+
+    __call__ = predict
+
+    def warm_up(self, runs=1):
+        blank = np.zeros((1, *self._input["shape"][1:]), dtype=np.float32)
+        for _ in range(runs):
+            self.predict(blank)
+
+    # Full-integer exports take and return int8; float-I/O exports pass through unchanged
+    def _quantize_input(self, images):
+        if self._input["dtype"] == np.float32:
+            return images
+        scale, zero_point = self._input["quantization"]
+        return np.round(images / scale + zero_point).astype(self._input["dtype"])
+
+    def _dequantize_output(self, output):
+        if self._output["dtype"] == np.float32:
+            return output
+        scale, zero_point = self._output["quantization"]
+        return (output.astype(np.float32) - zero_point) * scale
@@ -0,0 +1,162 @@
+"""Classify camera-trap videos and time-lapse sequences as a species timeline."""
+
+from collections import deque
+
+import numpy as np
+
+from .catalog import taxonomy
+from .config import (
+    BATCH_SIZE,
+    CONFIDENCE_THRESHOLD,
+    DECODE_WORKERS,
+    VIDEO_CHANGE_THRESHOLD,
+    VIDEO_SAMPLE_SECONDS,
+)
+from .imaging import preprocess_frame
+from .pipeline import iter_batch_inference
+
+# Side of the grayscale thumbnail frames are compared on
+CHANGE_THUMBNAIL_SIZE = 64
+
+
+def iter_video_frames(path, sample_every=VIDEO_SAMPLE_SECONDS):
+    """Yield (frame_index, time_s, bgr_frame) every ``sample_every`` seconds of a video.
+
+    ``path`` is anything ``cv2.VideoCapture`` opens, including image
+    sequences such as ``trap/img_%04d.jpg``. Frames between samples are only
+    grabbed, not decoded. Image sequences, and videos without a usable frame
+    rate, have every frame sampled and ``time_s`` set to the frame index.
+    """
+    import cv2
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video {path!r}")
+    try:
+        # OpenCV reports a nominal frame rate for printf-style image sequences; each image is already a sample
+        fps = 0.0 if "%" in str(path) else capture.get(cv2.CAP_PROP_FPS)
+        step = max(int(round(sample_every * fps)), 1) if fps > 0 else 1
+        index = 0
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps if fps > 0 else float(index), frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def change_thumbnail(frame):
+    import cv2
+
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (CHANGE_THUMBNAIL_SIZE, CHANGE_THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+
+
+def frame_difference(a, b):
+    """Mean absolute difference (0-255) between two change thumbnails."""
+    return float(np.mean(np.abs(a.astype(np.int16) - b.astype(np.int16))))
+
+
+def iter_video_predictions(model, path, sample_every=VIDEO_SAMPLE_SECONDS, change_threshold=VIDEO_CHANGE_THRESHOLD,
+                           batch_size=BATCH_SIZE, workers=DECODE_WORKERS):
+    """Yield one record per sampled frame, in order, classifying only frames that changed.
+
+    A sampled frame whose thumbnail differs from the last *classified* frame
+    by less than ``change_threshold`` is skipped and inherits that frame's
+    prediction; the rest are batched through ``iter_batch_inference``.
+    Records hold ``frame``, ``time_s``, ``classified``, ``species`` and
+    ``confidence``.
+    """
+    # Sampled frames waiting on the classified frame whose label they take:
+    # (frame_index, time_s, classified_index, was_classified)
+    waiting = deque()
+    classified = []
+
+    def frames_to_classify():
+        reference = None
+        for frame_index, time_s, frame in iter_video_frames(path, sample_every):
+            thumbnail = change_thumbnail(frame)
+            if reference is not None and frame_difference(thumbnail, reference) < change_threshold:
+                waiting.append((frame_index, time_s, len(classified) - 1, False))
+                continue
+            reference = thumbnail
+            classified.append(None)
+            waiting.append((frame_index, time_s, len(classified) - 1, True))
+            yield len(classified) - 1, frame
+
+    for batch_results in iter_batch_inference(model, frames_to_classify(), load=preprocess_frame,
+                                              batch_size=batch_size, workers=workers):
+        for index, result in batch_results:
+            # Keep the label, not the result's image array, so long videos don't pile up memory
+            classified[index] = {key: result[key] for key in ("error", "initial_pred_class", "initial_confidence")
+                                 if key in result}
+        resolved = max(index for index, _ in batch_results) + 1
+        while waiting and waiting[0][2] < resolved:
+            frame_index, time_s, index, was_classified = waiting.popleft()
+            yield _frame_record(frame_index, time_s, was_classified, classified[index])
+
+    # Trailing frames that only ever matched an already-classified frame
+    while waiting:
+        frame_index, time_s, index, was_classified = waiting.popleft()
+        yield _frame_record(frame_index, time_s, was_classified, classified[index])
+
+
+def _frame_record(frame_index, time_s, was_classified, result):
+    record = {"frame": frame_index, "time_s": time_s, "classified": was_classified}
+    if "error" in result:
+        record.update(species=None, confidence=None, error=result["error"])
+    else:
+        record.update(species=result["initial_pred_class"], confidence=result["initial_confidence"])
+    return record
+
+
+def build_timeline(records):
+    """Merge consecutive frame records with the same species into segments with taxonomy."""
+    segments = []
+    for record in records:
+        if segments and segments[-1]["species"] == record["species"]:
+            segment = segments[-1]
+            segment["end_s"] = record["time_s"]
+            segment["end_frame"] = record["frame"]
+        else:
+            segment = {
+                "species": record["species"],
+                "start_s": record["time_s"],
+                "end_s": record["time_s"],
+                "start_frame": record["frame"],
+                "end_frame": record["frame"],
+                "frames": 0,
+                "classified_frames": 0,
+                "confidences": [],
+            }
+            segments.append(segment)
+        segment["frames"] += 1
+        if record["classified"]:
+            segment["classified_frames"] += 1
+            if record["confidence"] is not None:
+                segment["confidences"].append(record["confidence"])
+
+    for segment in segments:
+        confidences = segment.pop("confidences")
+        segment["mean_confidence"] = float(np.mean(confidences)) if confidences else None
+        segment["needs_clarification"] = (segment["mean_confidence"] is None
+                                          or segment["mean_confidence"] < CONFIDENCE_THRESHOLD)
+        segment["taxonomy"] = taxonomy(segment["species"]) if segment["species"] else None
+    return segments
+
+
+def classify_video(model, path, **kwargs):
+    """Classify a video into ``{"segments": [...], "frames_sampled": n, "frames_classified": n}``.
+
+    Keyword arguments are passed to ``iter_video_predictions``.
+    """
+    records = list(iter_video_predictions(model, path, **kwargs))
+    return {
+        "path": path,
+        "frames_sampled": len(records),
+        "frames_classified": sum(record["classified"] for record in records),
+        "segments": build_timeline(records),
+    }
@@ -0,0 +1,258 @@
+"""Inference in separate worker processes, with batches handed over through shared memory."""
+
+import atexit
+import logging
+import math
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .catalog import CLASS_NAMES
+from .config import (
+    BATCH_SIZE,
+    IMG_HEIGHT,
+    IMG_WIDTH,
+    INFERENCE_WORKER_THREADS,
+    INFERENCE_WORKERS,
+    MODEL_BACKEND,
+)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SHAPE = (IMG_HEIGHT, IMG_WIDTH, 3)
+
+# Serializes the ``__main__`` swap, so concurrent pool starts never restore each other's stand-in
+_MAIN_MODULE_LOCK = threading.Lock()
+
+
+def _shared_array(shm, shape):
+    return np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+
+
+@contextmanager
+def _bare_main_module():
+    """Hide ``__main__`` while starting a process, so the spawned child doesn't re-run it.
+
+    Under Streamlit, ``__main__`` is the app script itself; a spawned child
+    would execute the whole script (and start a pool of its own) on import.
+    The swap is process-wide, so keep the block to the ``start()`` call.
+    """
+    with _MAIN_MODULE_LOCK:
+        main = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main
+
+
+def _worker_main(model_path, backend, threads, input_name, output_name, max_batch_size, conn):
+    """Worker process loop: load the model, then predict ``n`` rows of the input block per message."""
+    import tensorflow as tf
+
+    from .core import load_model, make_predictor
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    inputs = _shared_array(input_shm, (max_batch_size, *IMAGE_SHAPE))
+    outputs = _shared_array(output_shm, (max_batch_size, len(CLASS_NAMES)))
+    try:
+        model = load_model(model_path, backend=backend, num_threads=threads)
+        predictor = make_predictor(model)
+        predictor.warm_up()
+    except Exception as e:
+        conn.send(("error", repr(e)))
+        return
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            count = conn.recv()
+        except EOFError:
+            break
+        if count is None:
+            break
+        try:
+            batch = inputs[:count]
+            outputs[:count] = predictor(batch)
+        except Exception as e:
+            conn.send(("error", repr(e)))
+        else:
+            conn.send(("ok", count))
+
+    del inputs, outputs
+    input_shm.close()
+    output_shm.close()
+
+
+class _Worker:
+    """Parent-side handle: the process, its pipe and its input/output shared-memory blocks."""
+
+    def __init__(self, context, index, model_path, backend, threads, max_batch_size):
+        self.index = index
+        self.input_shm = shared_memory.SharedMemory(create=True, size=max_batch_size * int(np.prod(IMAGE_SHAPE)) * 4)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=max_batch_size * len(CLASS_NAMES) * 4)
+        self.inputs = _shared_array(self.input_shm, (max_batch_size, *IMAGE_SHAPE))
+        self.outputs = _shared_array(self.output_shm, (max_batch_size, len(CLASS_NAMES)))
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(model_path, backend, threads, self.input_shm.name, self.output_shm.name, max_batch_size, child_conn),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        with _bare_main_module():
+            self.process.start()
+        child_conn.close()
+
+    def receive(self):
+        try:
+            status, value = self.conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Inference worker {self.index} exited (code {self.process.exitcode})") from None
+        if status == "error":
+            raise RuntimeError(f"Inference worker {self.index} failed: {value}")
+        return value
+
+    def predict(self, images):
+        count = len(images)
+        self.inputs[:count] = images
+        self.conn.send(count)
+        self.receive()
+        return self.outputs[:count].copy()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+        del self.inputs, self.outputs
+        for shm in (self.input_shm, self.output_shm):
+            shm.close()
+            shm.unlink()
+
+
+class InferenceWorkerPool:
+    """Run the classifier in ``workers`` processes, each with its own model copy.
+
+    Preprocessed batches are copied into a worker's shared-memory input block
+    and probabilities read back from its output block; only row counts cross
+    the pipe, so tensors are never pickled. Inference then runs outside the
+    Streamlit server process, and each worker's TensorFlow (or TFLite) is
+    limited to ``threads_per_worker`` so the pool together fills the host's
+    cores without oversubscribing them.
+
+    ``predict`` is thread-safe and splits a batch across idle workers. The
+    app uses the pool as both its model and its predictor, since every
+    worker already runs its batches through its own compiled predictor.
+    """
+
+    def __init__(self, workers=INFERENCE_WORKERS, threads_per_worker=INFERENCE_WORKER_THREADS, model_path=None,
+                 backend=MODEL_BACKEND, max_batch_size=BATCH_SIZE):
+        if workers < 1:
+            raise ValueError("An inference worker pool needs at least one worker")
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_batch_size = max_batch_size
+        # Spawn, not fork: TensorFlow's thread pools don't survive a fork
+        context = multiprocessing.get_context("spawn")
+        self._workers = [
+            _Worker(context, i, model_path, backend, threads_per_worker, max_batch_size) for i in range(workers)
+        ]
+        self._idle = queue.Queue()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="inference-dispatch")
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._batches = 0
+        self._images = 0
+        self._seconds = 0.0
+        self._closed = False
+        # Unlink the shared-memory blocks even if the server exits without closing the pool
+        atexit.register(self.close)
+
+    def wait_ready(self):
+        """Block until every worker has loaded and warmed up its model."""
+        try:
+            for worker in self._workers:
+                worker.receive()
+                self._idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+        logger.info("Started %d inference workers with %d threads each", self.workers, self.threads_per_worker)
+
+    def _next_idle(self):
+        while True:
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                if not any(worker.process.is_alive() for worker in self._workers):
+                    raise RuntimeError("All inference workers have exited") from None
+
+    def _predict_chunk(self, images):
+        worker = self._next_idle()
+        with self._lock:
+            self._busy += 1
+        start = time.perf_counter()
+        try:
+            return worker.predict(images)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._busy -= 1
+                self._batches += 1
+                self._images += len(images)
+                self._seconds += elapsed
+            # A worker that crashed stays out of rotation
+            if worker.process.is_alive():
+                self._idle.put(worker)
+
+    def predict(self, images, verbose=0):
+        images = np.asarray(images, dtype=np.float32)
+        if images.ndim == 3:
+            images = images[None]
+        chunk_size = min(math.ceil(len(images) / self.workers), self.max_batch_size)
+        if len(images) <= chunk_size:
+            return self._predict_chunk(images)
+        chunks = [images[i:i + chunk_size] for i in range(0, len(images), chunk_size)]
+        return np.concatenate(list(self._executor.map(self._predict_chunk, chunks)))
+
+    __call__ = predict
+
+    def warm_up(self, runs=1):
+        """Workers warm up their own models on start; kept so the pool passes for a compiled predictor."""
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "threads_per_worker": self.threads_per_worker,
+                "alive": sum(worker.process.is_alive() for worker in self._workers),
+                "busy": self._busy,
+                "batches": self._batches,
+                "images": self._images,
+                "mean_batch_ms": self._seconds / self._batches * 1000.0 if self._batches else 0.0,
+            }
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown()
+        for worker in self._workers:
+            worker.close()
@@ -0,0 +1,46 @@
+"""The adaptive questionnaire must never settle on a species the answers don't single out."""
+
+import numpy as np
+import pytest
+
+from insect_id.adaptive import QuestionSelector
+from insect_id.catalog import CLASS_NAMES
+from insect_id.config import CONFIDENCE_THRESHOLD
+
+from test_rules import SEEDS
+
+SELECTOR = QuestionSelector()
+
+
+def priors(count, seed):
+    """A uniform prior, then random model outputs that stay below the threshold."""
+    yield np.full(len(CLASS_NAMES), 1 / len(CLASS_NAMES))
+    rng = np.random.default_rng(seed)
+    while count:
+        prior = rng.dirichlet(np.ones(len(CLASS_NAMES)) * rng.choice([0.2, 1.0, 5.0]))
+        if prior.max() < CONFIDENCE_THRESHOLD:
+            count -= 1
+            yield prior
+
+
+def answer_from(seed, prior):
+    """Run the questionnaire, answering every question it asks from ``seed``."""
+    answers = {}
+    while (question := SELECTOR.next_question(prior, answers)) is not None:
+        answers[question.key] = seed[question.key]
+    return answers
+
+
+@pytest.mark.parametrize("species", list(SEEDS))
+def test_settles_only_on_the_answered_species(species):
+    for prior in priors(100, seed=len(species)):
+        answers = answer_from(SEEDS[species], prior)
+        if SELECTOR.settled(prior, answers):
+            assert SELECTOR.best(prior, answers)[0] == species, answers
+
+
+def test_asks_the_wing_questions_that_separate_katydid_from_bean_bug():
+    uniform = np.full(len(CLASS_NAMES), 1 / len(CLASS_NAMES))
+    answers = answer_from(SEEDS["SLENDER MEADOW KATYDID"], uniform)
+    assert "transparent_wings" in answers
+    assert "INDIAN BEAN BUG" not in SELECTOR.rivals("SLENDER MEADOW KATYDID", answers)
@@ -0,0 +1,66 @@
+"""Near-duplicate lookup must find re-encoded copies, not other insects on the same background."""
+
+import cv2
+import numpy as np
+import pytest
+
+from insect_id.imaging import dhash, preprocess, thumbnail
+from insect_id.store import PredictionStore
+
+
+def encode(img, quality=95):
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def trap_background(seed):
+    """A fixed trap-style background: smooth colour gradients with sensor noise."""
+    rng = np.random.default_rng(seed)
+    background = cv2.resize((rng.random((6, 8, 3)) * 255).astype(np.uint8), (1600, 1200),
+                            interpolation=cv2.INTER_CUBIC)
+    background = cv2.GaussianBlur(background, (0, 0), 3)
+    return np.clip(background + rng.normal(0, 6, background.shape), 0, 255).astype(np.uint8)
+
+
+def put(store, key, img_array, predictions):
+    store.put(key, dhash(img_array), predictions, answers={"num_wings": "4"}, final_species="SPECIES A",
+              thumbnail=thumbnail(img_array))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PredictionStore(str(tmp_path / "predictions.sqlite3"), model="test")
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_different_subject_on_same_background_is_not_a_near_duplicate(store, seed):
+    background = trap_background(seed)
+    # Each subject covers about 5% of the frame, in the same spot
+    circle, rectangle = background.copy(), background.copy()
+    cv2.circle(circle, (800, 600), 155, (40, 40, 220), -1)
+    cv2.rectangle(rectangle, (660, 480), (940, 720), (40, 200, 40), -1)
+    first, second = preprocess(encode(circle)), preprocess(encode(rectangle))
+
+    put(store, "circle", first, np.eye(3, dtype=np.float32)[0])
+    assert store.nearest(dhash(second), thumbnail(second)) is None
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_resized_recompressed_copy_is_a_near_duplicate(store, seed):
+    photo = trap_background(seed)
+    cv2.circle(photo, (800, 600), 155, (40, 40, 220), -1)
+    original = preprocess(encode(photo))
+    copy = preprocess(encode(cv2.resize(photo, (800, 600), interpolation=cv2.INTER_AREA), quality=60))
+
+    put(store, "original", original, np.eye(3, dtype=np.float32)[0])
+    entry = store.nearest(dhash(copy), thumbnail(copy))
+    assert entry is not None and entry["key"] == "original"
+    np.testing.assert_array_equal(entry["predictions"], np.eye(3, dtype=np.float32)[0])
+
+
+def test_entries_without_a_thumbnail_only_match_exactly(store):
+    photo = preprocess(encode(trap_background(0)))
+    store.put("old", dhash(photo), np.eye(3, dtype=np.float32)[0])
+    assert store.nearest(dhash(photo), thumbnail(photo)) is None
+    assert store.get("old") is not None